@@ -0,0 +1,74 @@
+from array import array
+
+from TlvParser.TlvParser import BerTlvExtractor
+
+
+class BerTlvColumn():
+    # One tag path across many messages, Arrow "large binary" layout:
+    #   data    - all present values back to back (bytearray)
+    #   offsets - int64, len(column) + 1 entries; value i is data[offsets[i]:offsets[i + 1]]
+    #   present - one byte per row, 1 if the path was found (absent rows have an empty span)
+    def __init__(self, path):
+        self.path = path
+        self.data = bytearray()
+        self.offsets = array("q", [0])
+        self.present = bytearray()
+
+    def append(self, value):
+        if value is None:
+            self.present.append(0)
+        else:
+            self.data += value
+            self.present.append(1)
+        self.offsets.append(len(self.data))
+
+    def __len__(self):
+        return len(self.present)
+
+    def __getitem__(self, row):
+        if not self.present[row]:
+            return None
+        return bytes(self.data[self.offsets[row]:self.offsets[row + 1]])
+
+    def to_numpy(self):
+        # -> (data uint8, offsets int64, present bool); zero-copy views of the buffers,
+        # so the column cannot grow while they are alive
+        import numpy as np
+        return (np.frombuffer(self.data, dtype=np.uint8),
+                np.frombuffer(self.offsets, dtype=np.int64),
+                np.frombuffer(self.present, dtype=np.bool_))
+
+    def to_arrow(self):
+        # -> pyarrow.LargeBinaryArray with nulls for absent rows, built from the buffers directly
+        import pyarrow as pa
+        validity = bytearray((len(self) + 7) // 8)
+        for row, flag in enumerate(self.present):
+            if flag:
+                validity[row >> 3] |= 1 << (row & 7)
+        return pa.Array.from_buffers(pa.large_binary(), len(self),
+                                     [pa.py_buffer(validity), pa.py_buffer(self.offsets), pa.py_buffer(self.data)])
+
+
+class BerTlvColumnExporter():
+    # Flattens many messages into one BerTlvColumn per path without per-cell Python objects
+    # in the result. Messages may be BerTlv trees, BerTlvElements or raw bytes (raw bytes are
+    # projection-parsed, so only the subtrees leading to the paths are decoded; pass a parser to
+    # apply limits to them).
+    def __init__(self, paths, parser=None):
+        self.extractor = BerTlvExtractor(paths, parser)
+        self.paths = self.extractor.paths
+        self.columns = {path: BerTlvColumn(path) for path in self.paths}
+
+    def add(self, message):
+        found = self.extractor.extract_tuple(message)
+        for path, tlv_element in zip(self.paths, found):
+            self.columns[path].append(tlv_element.get_value_view() if tlv_element is not None else None)
+
+    def export(self, messages):
+        # -> {path: BerTlvColumn}; may be called repeatedly to keep appending
+        for message in messages:
+            self.add(message)
+        return self.columns
+
+    def __len__(self):
+        return len(self.columns[self.paths[0]]) if self.paths else 0
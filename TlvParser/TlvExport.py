@@ -0,0 +1,101 @@
+# Streaming exporters. A writer receives begin/start/value/end/finish events and writes
+# straight to a file-like object, so nothing but the current path is held in memory.
+# Events come either from a parsed tree (write_tree) or from a raw buffer
+# (BerTlvParser.write_json / write_xml), which never builds elements at all.
+#
+# JSON mirrors get_as_dict(): {"6F": {"84": "A000000025010403", "A5": {...}}}
+# XML:  <tlv><element tag="6F"><element tag="84">A000000025010403</element>...</element></tlv>
+
+
+class BerTlvJsonWriter():
+    def __init__(self, fp, indent=None):
+        self.fp = fp
+        self.indent = indent
+        self.__first = []   # one flag per open object: nothing written into it yet
+
+    def __newline(self, depth):
+        return "" if self.indent is None else "\n" + " " * (self.indent * depth)
+
+    def __key(self, tag_name):
+        if not self.__first[-1]:
+            self.fp.write(",")
+        self.__first[-1] = False
+        separator = ": " if self.indent is not None else ":"
+        self.fp.write(f'{self.__newline(len(self.__first))}"{tag_name}"{separator}')
+
+    def begin(self):
+        self.fp.write("{")
+        self.__first.append(True)
+
+    def start(self, tag_name):
+        self.__key(tag_name)
+        self.fp.write("{")
+        self.__first.append(True)
+
+    def value(self, tag_name, value):
+        self.__key(tag_name)
+        self.fp.write(f'"{bytes(value).hex().upper()}"')
+
+    def end(self):
+        empty = self.__first.pop()
+        self.fp.write(("" if empty else self.__newline(len(self.__first))) + "}")
+
+    def finish(self):
+        self.end()
+
+
+class BerTlvXmlWriter():
+    def __init__(self, fp, indent=None):
+        self.fp = fp
+        self.indent = indent
+        self.__empty = []   # one flag per open element: no child written yet
+
+    def __newline(self, depth):
+        return "" if self.indent is None else "\n" + " " * (self.indent * depth)
+
+    def begin(self):
+        self.fp.write('<?xml version="1.0" encoding="UTF-8"?>' + self.__newline(0) + "<tlv>")
+        self.__empty.append(True)
+
+    def start(self, tag_name):
+        self.__empty[-1] = False
+        self.fp.write(f'{self.__newline(len(self.__empty))}<element tag="{tag_name}">')
+        self.__empty.append(True)
+
+    def value(self, tag_name, value):
+        self.__empty[-1] = False
+        self.fp.write(f'{self.__newline(len(self.__empty))}<element tag="{tag_name}">'
+                      f'{bytes(value).hex().upper()}</element>')
+
+    def end(self):
+        empty = self.__empty.pop()
+        self.fp.write(("" if empty else self.__newline(len(self.__empty))) + "</element>")
+
+    def finish(self):
+        empty = self.__empty.pop()
+        self.fp.write(("" if empty else self.__newline(0)) + "</tlv>")
+
+
+def write_tree(tlv, writer):
+    # tlv: BerTlv or BerTlvElement; walked iteratively, so deep trees do not hit the recursion limit
+    if hasattr(tlv, "tlv_elements"):
+        roots = tlv.tlv_elements.items()
+    else:
+        roots = [(tlv.get_tag().hex().upper(), tlv)]
+    writer.begin()
+    stack = [iter(roots)]
+    while stack:
+        item = next(stack[-1], None)
+        if item is None:
+            stack.pop()
+            if stack:
+                writer.end()
+            continue
+        tag_name, tlv_element = item
+        children = tlv_element.iter_children()
+        if tlv_element.is_constructed or len(children):
+            writer.start(tag_name)
+            stack.append(iter(children))
+        else:
+            writer.value(tag_name, tlv_element.get_value_view())
+    writer.finish()
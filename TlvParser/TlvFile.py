@@ -0,0 +1,95 @@
+import mmap
+from array import array
+
+from TlvParser.TlvParser import BerTlvParser
+
+
+class BerTlvFile():
+    # Memory-mapped access to a file of concatenated top-level BER-TLV records.
+    # Records are located by hopping over headers, so only one record is decoded at a time.
+    # A sparse table of every `checkpoint_interval`-th record offset makes seek() cheap
+    # without keeping an offset per record.
+    def __init__(self, path, parser=None, checkpoint_interval=1024):
+        self.path = path
+        self.parser = parser if parser is not None else BerTlvParser()
+        self.checkpoint_interval = checkpoint_interval
+        self.__file = open(path, "rb")
+        try:
+            self.__map = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty file: nothing to map
+            self.__map = b""
+        self.__checkpoints = array("Q", [0])
+        self.__scanned_to = 0   # records whose start offsets are covered by the checkpoints
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        if isinstance(self.__map, mmap.mmap):
+            self.__map.close()
+        self.__file.close()
+
+    def size(self):
+        return len(self.__map)
+
+    def __record_end(self, offset):
+        try:
+            end = self.parser.skip_element(self.__map, offset)
+        except IndexError as e:
+            raise ValueError(f"Truncated record at offset {offset}: {e}") from e
+        if end > len(self.__map):
+            raise ValueError(f"Truncated record at offset {offset}: needs {end} bytes, file has {len(self.__map)}")
+        return end
+
+    def iter_spans(self, start_index=0):
+        # Yields (offset, total length) of each record from start_index on, without decoding values.
+        index, offset = start_index, self.seek(start_index)
+        size = len(self.__map)
+        while offset < size:
+            end = self.__record_end(offset)
+            yield offset, end - offset
+            index += 1
+            offset = end
+            if index > self.__scanned_to:
+                self.__scanned_to = index
+                if index % self.checkpoint_interval == 0:
+                    self.__checkpoints.append(offset)
+
+    def seek(self, index):
+        # Offset of record `index`: jump to the nearest checkpoint, then hop over headers.
+        if index < 0:
+            raise IndexError("Negative record index")
+        checkpoint = min(index // self.checkpoint_interval, len(self.__checkpoints) - 1)
+        current, offset = checkpoint * self.checkpoint_interval, self.__checkpoints[checkpoint]
+        while current < index:
+            if offset >= len(self.__map):
+                raise IndexError(f"Record index {index} out of range ({current} records)")
+            offset = self.__record_end(offset)
+            current += 1
+            if current > self.__scanned_to:
+                self.__scanned_to = current
+                if current % self.checkpoint_interval == 0:
+                    self.__checkpoints.append(offset)
+        return offset
+
+    def read_raw(self, index):
+        offset = self.seek(index)
+        if offset >= len(self.__map):
+            raise IndexError(f"Record index {index} out of range")
+        return self.__map[offset:self.__record_end(offset)]
+
+    def __getitem__(self, index):
+        return self.parser.parse_tlv_bytes(self.read_raw(index))
+
+    def __iter__(self):
+        # Each record is copied out of the map before parsing, so the parsed trees do not pin it.
+        for offset, length in self.iter_spans():
+            yield self.parser.parse_tlv_bytes(self.__map[offset:offset + length])
+
+    def count(self):
+        known = self.__scanned_to
+        return known + sum(1 for _ in self.iter_spans(known))
@@ -1,10 +1,23 @@
 import binascii
 from enum import Enum, auto
-from bitops import get_bit_range_as_int
 from collections import namedtuple, OrderedDict
 import pprint
-
-from bitops.BinaryOperations import get_effective_length_in_bytes, set_bit_range_from_int, set_bit
+from types import MappingProxyType
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from collections import deque
+import os
+import io
+import hashlib
+import sys
+from array import array
+from bisect import bisect_left
+
+from bitops.BinaryOperations import get_effective_length_in_bytes
+
+from TlvParser.TlvValues import decode_int, decode_bcd, decode_cn, decode_date, decode_str, decode_batch
+from TlvParser.TlvExport import BerTlvJsonWriter, BerTlvXmlWriter, write_tree
+from TlvParser.TlvStats import BerTlvStats
 
 DUMMY_TAG = 0xFF
 PATH_SEPARATOR = "/"
@@ -67,73 +80,199 @@ class TLV_TAG_TYPE(Enum):
 Tag = namedtuple('Tag', ['tag_class', 'is_constructed', 'tag_type', 'is_long_form'])
 TagTypeBytes = namedtuple('TagTypeBytes', ['more', 'tag_type'])
 Length = namedtuple('Length', ['is_long_form', 'length'])
-
-
-class BerTlvElement():
-    def __init__(self, tag, value=None):
-        self.__tag_bytes = None
+Header = namedtuple('Header', ['tag', 'tag_end', 'value_offset', 'length'])
+BerTlvLimits = namedtuple('BerTlvLimits', ['max_depth', 'max_elements', 'max_length_of_length', 'max_size'],
+                          defaults=(None, None, None, None))
+# a reasonable starting point for messages from untrusted terminals
+UNTRUSTED_LIMITS = BerTlvLimits(max_depth=16, max_elements=4096, max_length_of_length=3, max_size=1 << 20)
+# one difference reported by diff(): old is None for added elements, new is None for removed ones
+DiffEntry = namedtuple('DiffEntry', ['path', 'old', 'new'])
+ScanEntry = namedtuple('ScanEntry', ['depth', 'tag', 'header_offset', 'value_offset', 'length', 'parent'])
+TagDescriptor = namedtuple('TagDescriptor', ['tag', 'tag_bytes', 'tag_class', 'is_constructed', 'tag_type',
+                                             'is_long_form'])
+
+# 256-entry decode tables, indexed by octet value, so the parse path does no per-octet bit twiddling
+_TAG_FIRST_OCTET = tuple(Tag(TLV_TAG_CLASS(b >> 6), (b >> 5) & 1, b & 0x1F, (b & 0x1F) == 0x1F) for b in range(256))
+_TAG_NEXT_OCTET = tuple(TagTypeBytes(bool(b & 0x80), b) for b in range(256))
+_LENGTH_OCTET = tuple(Length(bool(b & 0x80), b & 0x7F) for b in range(256))
+_TAG_IS_LONG_FORM = tuple(octet.is_long_form for octet in _TAG_FIRST_OCTET)
+_TAG_HAS_MORE = tuple(octet.more for octet in _TAG_NEXT_OCTET)
+_LENGTH_IS_LONG_FORM = tuple(octet.is_long_form for octet in _LENGTH_OCTET)
+
+# Interned tag metadata: every 9F02 shares one descriptor (and one int and one bytes object).
+# Keyed by both the int and the bytes form; capped so hostile input cannot grow it without bound.
+_TAG_DESCRIPTORS = {}
+_MAX_INTERNED_TAGS = 4096
+
+
+def _tag_descriptor(tag):
+    descriptor = _TAG_DESCRIPTORS.get(tag)
+    if descriptor is None:
         if isinstance(tag, int):
-            self.tag = tag
-            self.__tag_bytes = tag.to_bytes(get_effective_length_in_bytes(tag), byteorder="big")
+            tag_int, tag_bytes = tag, tag.to_bytes(get_effective_length_in_bytes(tag), byteorder="big")
         elif isinstance(tag, bytes):
-            self.tag = int.from_bytes(tag, byteorder="big")
-            self.__tag_bytes = tag
+            tag_int, tag_bytes = int.from_bytes(tag, byteorder="big"), tag
         else:
             raise TypeError("tag must be int or bytes")
+        descriptor = _TAG_DESCRIPTORS.get(tag_bytes if tag is tag_int else tag_int)
+        if descriptor is None:
+            first = _TAG_FIRST_OCTET[tag_bytes[0]]
+            descriptor = TagDescriptor(tag_int, tag_bytes, first.tag_class, bool(first.is_constructed),
+                                       first.tag_type, first.is_long_form)
+        if len(_TAG_DESCRIPTORS) < _MAX_INTERNED_TAGS:
+            _TAG_DESCRIPTORS[tag_int] = _TAG_DESCRIPTORS[tag_bytes] = descriptor
+    return descriptor
+
+_NO_VALUE = b""
+_ZERO_LENGTH = b"\x00"
+_NO_CHILDREN = MappingProxyType(OrderedDict())
+_INDEFINITE_LENGTH = b"\x80"
+_END_OF_CONTENTS = b"\x00\x00"
+
+
+class TlvDecodeError(ValueError):
+    # Malformed encoding; offset is where the offending element (or header) starts
+    def __init__(self, message, offset):
+        super().__init__(f"{message} at offset {offset}")
+        self.reason = message
+        self.offset = offset
+
+    def __reduce__(self):
+        # picklable, so parse_many() workers can raise it
+        return TlvDecodeError, (self.reason, self.offset)
+
+
+def _length_octets(length):
+    # what get_length() decodes: the length octets without the 0x8N long-form prefix
+    if length <= 127:
+        return bytes([length])
+    return length.to_bytes((length.bit_length() + 7) // 8, 'big')
+
+
+class BerTlvElement():
+    # Slotted: millions of parsed elements are kept in memory by batch users, so there is no
+    # per-instance __dict__, leaves share one empty children mapping, length octets are bytes and
+    # parsed values are (shared buffer, start, end) spans rather than one memoryview per element.
+    __slots__ = ("tag", "is_dummy", "tag_class", "is_constructed", "is_length_long_form",
+                 "__tag_bytes", "__tag_type_first_octet", "__is_tag_long_form",
+                 "__value_bytes", "__value_start", "__value_end",
+                 "__length_of_length", "__length_bytes", "__children_tlvs", "__children_loader",
+                 "__observer", "__parent", "__encoded", "__encoded_start", "__encoded_end",
+                 "__is_length_indefinite", "__frozen", "__digest", "__splice")
+
+    def __init__(self, tag, value=None):
+        descriptor = _tag_descriptor(tag)
+        self.tag = descriptor.tag
+        self.__tag_bytes = descriptor.tag_bytes
 
         self.is_dummy = (self.tag == DUMMY_TAG)
 
-        parsed = self.__parse_tag(self.__tag_bytes[0])
-        self.tag_class = parsed.tag_class
-        self.is_constructed = bool(parsed.is_constructed)
-        self.__tag_type_first_octet = parsed.tag_type
-        self.__is_tag_long_form = bool(parsed.is_long_form)
+        self.tag_class = descriptor.tag_class
+        self.is_constructed = descriptor.is_constructed
+        self.__tag_type_first_octet = descriptor.tag_type
+        self.__is_tag_long_form = descriptor.is_long_form
 
-        self.__value_bytes = bytearray()
+        self.__value_bytes = _NO_VALUE
+        self.__value_start = 0
+        self.__value_end = None
 
         self.__length_of_length = 0
-        self.__length_bytes = bytearray([0])
-
-        self.__children_tlvs = OrderedDict()
+        self.__length_bytes = _ZERO_LENGTH
+        self.__is_length_indefinite = False
+
+        self.__children_tlvs = None
+        self.__children_loader = None
+        self.__observer = None
+        # encode() cache: (shared encoded buffer, start, end); None when dirty
+        self.__parent = None
+        self.__encoded = None
+        self.__encoded_start = 0
+        self.__encoded_end = 0
+        self.__frozen = False
+        # get_digest() cache, (digest, encoded size); cleared together with the encode cache
+        self.__digest = None
+        # shallow copies: (source, {tag name: source child replaced, or None if appended})
+        self.__splice = None
 
         if value is not None:
             if isinstance(value, dict):
-                for t, tlv_item in value.items():
-                    self.__children_tlvs[t] = tlv_item
+                for tlv_item in value.values():
+                    self.__check_adoptable(tlv_item)
+                self.__children_tlvs = OrderedDict(value)
                 self.is_constructed = True
+                for tlv_item in self.__children_tlvs.values():
+                    self.__adopt(tlv_item)
             else:
                 # value is bytes-like
-                for b in value:
-                    self.__value_bytes.append(b)
+                self.__value_bytes = bytearray(value)
                 if len(self.__value_bytes):
-                    self.__length_bytes = bytearray(self.__convert_int_length_to_tlv_bytes(len(self.__value_bytes)))
-                    self.__length_of_length = len(self.__length_bytes)
-
-        self.is_length_long_form = (len(self.__length_bytes) > 1)
+                    self.__length_bytes = _length_octets(len(self.__value_bytes))
+                    # octets after 0x8N, as for parsed elements; 0 in short form
+                    self.__length_of_length = len(self.__length_bytes) if len(self.__value_bytes) > 127 else 0
+
+        self.is_length_long_form = self.get_length() > 127
+
+    def __reduce__(self):
+        # Pickle/deepcopy support: the subtree is flattened into one pre-order list of
+        # (parent position, tag name, element state), so deep trees are saved and loaded without
+        # recursion. The parent is not saved, so a copied subtree is a new root.
+        records = []
+        stack = [(self, -1, None)]
+        while stack:
+            tlv_element, parent_index, tag_name = stack.pop()
+            records.append((parent_index, tag_name, tlv_element.__getstate__()))
+            position = len(records) - 1
+            stack.extend((child, position, name)
+                         for name, child in reversed(list(tlv_element.__children().items())))
+        return _rebuild_element, (records,)
+
+    def __getstate__(self):
+        # Own state of this element; children are saved by __reduce__. Parsed value spans become
+        # plain bytes, lazy children are materialized and the encode cache, index observer and
+        # loader are left behind.
+        value = self.__value_bytes if self.__value_end is None else bytes(self.__value())
+        return (self.tag, self.is_dummy, self.tag_class, self.is_constructed, self.is_length_long_form,
+                self.__tag_bytes, self.__tag_type_first_octet, self.__is_tag_long_form, value,
+                self.__length_of_length, self.__length_bytes, self.__is_length_indefinite)
+
+    def __setstate__(self, state):
+        (self.tag, self.is_dummy, self.tag_class, self.is_constructed, self.is_length_long_form,
+         self.__tag_bytes, self.__tag_type_first_octet, self.__is_tag_long_form, self.__value_bytes,
+         self.__length_of_length, self.__length_bytes, self.__is_length_indefinite) = state
+        self.__children_tlvs = None
+        self.__parent = None
+        self.__value_start = 0
+        self.__value_end = None
+        self.__children_loader = None
+        self.__observer = None
+        self.__encoded = None
+        self.__encoded_start = 0
+        self.__encoded_end = 0
+        self.__frozen = False   # copies of a frozen template are editable
+        self.__digest = None
+        self.__splice = None
 
     def __eq__(self, other):
-        return self.get_tag() == other.get_tag() and \
-               self.get_length() == other.get_length() and \
-               self.get_value() == other.get_value()
+        # Same tag, same declared length and same content: values of leaves, children (in order) of
+        # constructed elements. Compares subtree digests, so repeated comparisons of large trees are O(1).
+        if self is other:
+            return True
+        if not isinstance(other, BerTlvElement):
+            return NotImplemented
+        return self.get_digest() == other.get_digest()
 
     def __str__(self):
-        if len(self.__children_tlvs) > 0:
+        if len(self.__children()) > 0:
             return f"{self.get_tag().hex()}  {self.get_length()}"
         else:
             return f"{self.get_tag().hex()}  {self.get_length()}   {self.get_value_as_hex_str()}"
 
     def __repr__(self):
-        if len(self.__children_tlvs) > 0:
+        if len(self.__children()) > 0:
             return f"{self.get_tag().hex()}  {self.get_length()}  {self.get_children()}"
         else:
             return f"{self.get_tag().hex()}  {self.get_length()}   {self.get_value_as_hex_str()}"
 
-    def __parse_tag(self, first_byte):
-        tag_class = get_bit_range_as_int(first_byte, 6, 8)
-        is_constructed = get_bit_range_as_int(first_byte, 5, 6)
-        tag_type = get_bit_range_as_int(first_byte, 0, 5)
-        return Tag(TLV_TAG_CLASS(tag_class), is_constructed, tag_type, tag_type == 31)
-
     def get_class(self):
         return self.tag_class
 
@@ -141,13 +280,67 @@ class BerTlvElement():
         return self.is_constructed
 
     def get_children(self):
-        return self.__children_tlvs
+        # The live children dict, allocated on first request for leaves. Treat it as read-only:
+        # editing it directly skips cache invalidation and the path index; use add_child() and
+        # replace_child().
+        children = self.__children()
+        if children is _NO_CHILDREN:
+            children = self.__children_tlvs = OrderedDict()
+        return children
+
+    def __children(self):
+        # read-only access that does not allocate a dict for leaf elements
+        if self.__children_loader is not None:
+            loader, self.__children_loader = self.__children_loader, None
+            try:
+                loader(self)
+            except BaseException:
+                # drop the partial children, so the next access decodes (and fails) again
+                self.__children_tlvs = None
+                self.__children_loader = loader
+                raise
+        return _NO_CHILDREN if self.__children_tlvs is None else self.__children_tlvs
+
+    def iter_children(self):
+        # (tag name, child) pairs without allocating a children dict for leaves
+        return self.__children().items()
+
+    def set_children_loader(self, loader):
+        # Defer child decoding: loader(self) is called once, on first access to the children.
+        self.__check_mutable()
+        self.__children_loader = loader
+
+    def is_materialized(self):
+        return self.__children_loader is None
+
+    def set_observer(self, observer):
+        # observer.child_added(parent, tag_name, child) is called after every add_child on this element
+        self.__observer = observer
 
     def get_tag(self):
         return bytes(self.__tag_bytes)
 
+    def __value(self):
+        if self.__value_end is None:
+            return self.__value_bytes
+        return self.__value_bytes[self.__value_start:self.__value_end]
+
     def get_value(self):
-        return bytes(self.__value_bytes)
+        return bytes(self.__value())
+
+    def get_value_view(self):
+        # zero-copy view; for parsed elements this aliases the parsed buffer
+        return memoryview(self.__value())
+
+    def is_length_indefinite(self):
+        return self.__is_length_indefinite
+
+    def set_length_indefinite(self, indefinite=True):
+        # constructed elements flagged indefinite are encoded as 0x80 ... 00 00;
+        # get_length() still reports the size of the content
+        self.__check_mutable()
+        self.__is_length_indefinite = indefinite
+        self.__invalidate()
 
     def is_tag_long_form(self):
         return self.__is_tag_long_form
@@ -155,62 +348,267 @@ class BerTlvElement():
     def is_tag_constructed(self):
         return self.is_constructed
 
+    def get_parent(self):
+        return self.__parent
+
+    def __check_adoptable(self, tlv):
+        # An element has one parent, the one its edits invalidate, so it cannot sit under two;
+        # add a copy (copy.deepcopy) instead.
+        if not self.is_dummy and isinstance(tlv, BerTlvElement) and tlv.__parent is not None \
+                and tlv.__parent is not self:
+            raise ValueError(f"Element {tlv.get_tag().hex().upper()} already has a parent "
+                             f"({tlv.__parent.get_tag().hex().upper()}); add a copy instead")
+
+    def __adopt(self, tlv):
+        # the dummy FF wrapper only borrows the roots, it never becomes their parent
+        if not self.is_dummy and isinstance(tlv, BerTlvElement):
+            self.__check_adoptable(tlv)
+            tlv.__parent = self
+
+    def __invalidate(self):
+        # Drop the cached encoding and digest here and on every ancestor. An element is only cached
+        # if its whole subtree is, so the walk can stop at the first ancestor that is already dirty.
+        node = self
+        while node is not None and (node.__encoded is not None or node.__digest is not None):
+            node.__encoded = None
+            node.__digest = None
+            node = node.__parent
+
+    def is_encoding_cached(self):
+        return self.__encoded is not None
+
+    def get_digest(self):
+        # Merkle-style content hash. Every element hashes its tag and its length as encode() would
+        # write it: the content size (value size, or the encoded sizes of the children) and its form
+        # (indefinite, or a long form declared wider than needed). A leaf adds its value, a
+        # constructed element its children's digests. The stored length octets are not used, so
+        # edits compare equal before and after encode(). Computed on first use (iteratively,
+        # bottom-up) and cached, with the encoded size, until the subtree is edited. Values aliasing
+        # a writable caller buffer (parse_tlv_bytes() on a bytearray, set_value_view()) can change
+        # behind the element, so those digests are never cached.
+        return self.__digested()[0]
+
+    def __digested(self):
+        # -> (digest, encoded size)
+        if self.__digest is not None:
+            return self.__digest
+        uncached = {}   # id() -> (digest, encoded size) of elements that must not cache theirs
+        stack = [(self, False)]
+        while stack:
+            tlv_element, children_done = stack.pop()
+            if tlv_element.__digest is not None or id(tlv_element) in uncached:
+                continue
+            children = tlv_element.__children()
+            if children and not children_done:
+                stack.append((tlv_element, True))
+                stack.extend((child, False) for child in children.values())
+                continue
+            cacheable = True
+            if children:
+                digested = []
+                for child in children.values():
+                    child_digested = child.__digest
+                    if child_digested is None:
+                        child_digested = uncached[id(child)]
+                        cacheable = False
+                    digested.append(child_digested)
+                content = sum(size for _, size in digested)
+            else:
+                value_bytes = tlv_element.__value_bytes
+                cacheable = not isinstance(value_bytes, memoryview) or value_bytes.readonly
+                content = len(tlv_element.__value())
+            tag_bytes = tlv_element.__tag_bytes
+            indefinite = tlv_element.__is_length_indefinite and (tlv_element.is_constructed or bool(children))
+            length_bytes = _length_octets(content)
+            if indefinite:
+                length_of_length, size = 0, len(tag_bytes) + 1 + content + 2
+            else:
+                length_of_length = max(tlv_element.__length_of_length, len(length_bytes) if content > 127 else 0)
+                size = len(tag_bytes) + 1 + (len(length_bytes) if content > 127 else 0) + content
+            digest = hashlib.blake2b(bytes((1 if children else 0, len(tag_bytes))), digest_size=16)
+            digest.update(tag_bytes)
+            digest.update(bytes((length_of_length, indefinite, len(length_bytes))))
+            digest.update(length_bytes)
+            if children:
+                for child_digest, _ in digested:
+                    digest.update(child_digest)
+            else:
+                digest.update(tlv_element.__value())
+            if cacheable:
+                tlv_element.__digest = (digest.digest(), size)
+            else:
+                uncached[id(tlv_element)] = (digest.digest(), size)
+        return self.__digest if self.__digest is not None else uncached[id(self)]
+
+    def diff(self, other):
+        # -> [DiffEntry(path, old, new)] in document order, paths as for BerTlv.find() ("6F/A5/50").
+        # Only subtrees whose digests differ are visited, so unchanged parts of large trees cost
+        # one digest comparison each.
+        return _diff([(self.get_tag().hex().upper(), self, other)])
+
+    def freeze(self):
+        # Make this subtree read-only (see TlvTemplate.py). It is encoded first, so every frozen
+        # element keeps a cached encoding that copies of its parents can reuse.
+        self.encode()
+        self.get_digest()
+        stack = [self]
+        while stack:
+            tlv_element = stack.pop()
+            tlv_element.__frozen = True
+            stack.extend(tlv_element.__children().values())
+        return self
+
+    def is_frozen(self):
+        return self.__frozen
+
+    def __check_mutable(self):
+        if self.__frozen:
+            raise TypeError(f"Element {self.get_tag().hex().upper()} is frozen")
+
+    def shallow_copy(self):
+        # New, editable element with this tag, length and value. The children are the very same
+        # objects, shared rather than re-parented, and the copy starts without a cached encoding.
+        # Shared children must never change, so only frozen elements can be copied this way.
+        # The copy remembers which children get replaced or added, so encode() splices its
+        # content from this element's cached encoding instead of copying every child.
+        if not self.__frozen:
+            raise ValueError(f"Element {self.get_tag().hex().upper()} must be frozen to be shallow-copied")
+        tlv_copy = BerTlvElement(self.__tag_bytes if isinstance(self.__tag_bytes, bytes) else bytes(self.__tag_bytes))
+        tlv_copy.is_constructed = self.is_constructed
+        tlv_copy.is_length_long_form = self.is_length_long_form
+        tlv_copy.__value_bytes = self.__value_bytes
+        tlv_copy.__value_start = self.__value_start
+        # a shared bytearray is referenced as a span, so in-place edits of the copy copy it first
+        tlv_copy.__value_end = len(self.__value_bytes) if self.__value_end is None else self.__value_end
+        tlv_copy.__length_of_length = self.__length_of_length
+        tlv_copy.__length_bytes = self.__length_bytes
+        tlv_copy.__is_length_indefinite = self.__is_length_indefinite
+        children = self.__children()
+        if children is not _NO_CHILDREN:
+            tlv_copy.__children_tlvs = children.copy()
+            if self.__encoded is not None:
+                tlv_copy.__splice = (self, OrderedDict())
+        return tlv_copy
+
+    def replace_child(self, tag_name, tlv):
+        # Put tlv in place of the child named tag_name (or append it), keeping the child order
+        self.__check_mutable()
+        self.__check_adoptable(tlv)
+        children = self.get_children()
+        replaced = children.get(tag_name.upper())
+        if isinstance(replaced, BerTlvElement) and replaced is not tlv and replaced.__parent is self:
+            replaced.__parent = None
+        children[tag_name.upper()] = tlv
+        self.__adopt(tlv)
+        self.__note_child(tag_name.upper(), replaced)
+        self.__invalidate()
+        if self.__observer is not None:
+            self.__observer.child_added(self, tag_name.upper(), tlv)
+
     def set_tag_type_bytes(self, b):
+        self.__check_mutable()
         self.__tag_bytes = b
+        self.__invalidate()
 
     def add_tag_type_byte(self, byte):
+        self.__check_mutable()
         if isinstance(byte, int):
             byte = byte.to_bytes(1, byteorder="big")
         self.__tag_bytes += byte
+        self.__invalidate()
 
     def set_length_of_length(self, length_of_length):
+        self.__check_mutable()
         self.__length_of_length = length_of_length
+        self.__invalidate()
 
     def clear_length_bytes(self):
-        self.__length_bytes = bytearray()
+        self.__check_mutable()
+        self.__length_bytes = b""
+        self.__invalidate()
 
     def set_length(self, length):
-        self.clear_length_bytes()
-        self.__length_bytes.append(length & 0xFF)
+        self.__check_mutable()
+        self.__length_bytes = bytes([length & 0xFF])
+        self.__invalidate()
 
     def get_length(self):
-        return int.from_bytes(bytes(self.__length_bytes), "big") if self.__length_bytes else 0
+        return int.from_bytes(self.__length_bytes, "big") if self.__length_bytes else 0
 
     def set_length_bytes(self, b):
-        # Accept bytes/bytearray/list of ints
-        if isinstance(b, (bytes, bytearray)):
-            self.__length_bytes = bytearray(b)
-        else:
-            self.__length_bytes = bytearray(b)
+        # Accept bytes/bytearray/memoryview/list of ints
+        self.__check_mutable()
+        self.__length_bytes = bytes(b)
+        self.__invalidate()
 
     def add_length_byte(self, byte):
-        self.__length_bytes.append(byte & 0xFF)
+        self.__check_mutable()
+        self.__length_bytes += bytes([byte & 0xFF])
+        self.__invalidate()
         return self.__length_of_length - len(self.__length_bytes)
 
     def set_value_bytes(self, b):
+        self.__check_mutable()
         if isinstance(b, (bytes, bytearray)):
             self.__value_bytes = bytearray(b)
         else:
             # list of ints
             self.__value_bytes = bytearray(b)
+        self.__value_end = None
+        self.__invalidate()
+
+    def set_value_view(self, view, start=0, end=None):
+        # Reference view[start:end] of a caller-owned buffer instead of copying it.
+        # The span is copied into a private bytearray on the first in-place mutation.
+        self.__check_mutable()
+        self.__value_bytes = view if isinstance(view, memoryview) else memoryview(view)
+        self.__value_start = start
+        self.__value_end = len(self.__value_bytes) if end is None else end
+        self.__invalidate()
 
     def set_value(self, value_byte):
+        self.__check_mutable()
         self.__value_bytes = bytearray()
         self.__value_bytes.append(value_byte & 0xFF)
+        self.__value_end = None
+        self.__invalidate()
         return self.get_length() - len(self.__value_bytes)
 
     def add_value_byte(self, byte):
+        self.__check_mutable()
+        if self.__value_end is not None or not isinstance(self.__value_bytes, bytearray):
+            self.__value_bytes = bytearray(self.__value())
+            self.__value_end = None
         self.__value_bytes.append(byte & 0xFF)
+        self.__invalidate()
         return self.get_length() - len(self.__value_bytes)
 
     def get_value_as_hex_str(self):
-        return (bytes(self.__value_bytes)).hex()
+        return self.__value().hex()
 
-    def get_value_as_int(self):
-        # optional: implement when needed
-        pass
+    def get_value_as_int(self, signed=False):
+        # binary big-endian ("b"), e.g. 9F36
+        return decode_int(self.__value(), signed)
+
+    def get_value_as_bcd(self):
+        # packed BCD ("n"), e.g. 9F02 / 9F03 amounts, 5F2A / 9F1A codes
+        return decode_bcd(self.__value())
+
+    def get_value_as_cn(self):
+        # compressed numeric ("cn") as a digit string, e.g. 5A PAN
+        return decode_cn(self.__value())
+
+    def get_value_as_date(self):
+        # YYMMDD BCD as datetime.date, e.g. 9A, 5F24
+        return decode_date(self.__value())
+
+    def get_value_as_str(self, encoding="ascii"):
+        # "a" / "an" / "ans", e.g. 50 application label
+        return decode_str(self.__value(), encoding)
 
     def add_child(self, tlv):
+        self.__check_mutable()
+        children = self.get_children()
         if isinstance(tlv, str):
             raise AssertionError(f"Str input is not supported by add_child function. Passed value: {tlv}")
         if isinstance(tlv, list):
@@ -219,24 +617,72 @@ class BerTlvElement():
                 self.add_child(it)
         elif isinstance(tlv, (dict, OrderedDict)):
             for k, v in tlv.items():
-                self.__children_tlvs[k.upper()] = v
+                self.__check_adoptable(v)
+                replaced = children.get(k.upper())
+                children[k.upper()] = v
+                self.__adopt(v)
+                self.__note_child(k.upper(), replaced)
+                self.__invalidate()
+                if self.__observer is not None:
+                    self.__observer.child_added(self, k.upper(), v)
         else:
             tag_name = tlv.get_tag().hex().upper()
-            if tag_name in self.__children_tlvs:
+            if tag_name in children:
                 raise LookupError(f"Tag duplication while parsing: {tag_name}")
-            self.__children_tlvs[tag_name] = tlv
+            self.__check_adoptable(tlv)
+            children[tag_name] = tlv
+            self.__adopt(tlv)
+            self.__note_child(tag_name, None)
+            self.__invalidate()
+            if self.__observer is not None:
+                self.__observer.child_added(self, tag_name, tlv)
+
+    def __note_child(self, tag_name, replaced):
+        # shallow copies keep the first source child seen under each changed tag name
+        if self.__splice is not None:
+            self.__splice[1].setdefault(tag_name, replaced)
+
+    def __spliced_parts(self):
+        # The content of a shallow copy as (child, None) / (None, run of source octets) entries in
+        # document order, the runs taken from the source's cached encoding. None if that is not
+        # possible: every replaced source child must still hold its span of that same buffer.
+        source, changed = self.__splice
+        encoded = source.__encoded
+        if encoded is None:
+            return None
+        replaced = []
+        for tag_name, old in changed.items():
+            if old is not None:
+                if old.__encoded is not encoded:
+                    return None
+                replaced.append((old.__encoded_start, old.__encoded_end, tag_name))
+        replaced.sort()
+        encoded = memoryview(encoded)
+        content_end = source.__encoded_end - (2 if source.__is_length_indefinite else 0)
+        position = content_end - source.get_length()
+        children = self.__children_tlvs
+        parts = []
+        for start, end, tag_name in replaced:
+            if start > position:
+                parts.append((None, encoded[position:start]))
+            parts.append((children[tag_name], None))
+            position = end
+        if content_end > position:
+            parts.append((None, encoded[position:content_end]))
+        parts.extend((children[tag_name], None) for tag_name, old in changed.items() if old is None)
+        return parts
 
     def get_as_list(self, tlv_element=None):
         if not tlv_element:
             tlv_element = self
-        unfolded = [self.get_as_list(child) for child in tlv_element.__children_tlvs.values()]
+        unfolded = [self.get_as_list(child) for child in tlv_element.__children().values()]
         return [tlv_element, unfolded] if len(unfolded) > 0 else tlv_element
 
     def get_as_dict(self, tlv_element=None):
         if not tlv_element:
             tlv_element = self
             return {tlv_element.get_tag().hex().upper(): self.get_as_dict(tlv_element)}
-        unfolded = {tag_name: self.get_as_dict(child) for tag_name, child in tlv_element.__children_tlvs.items()}
+        unfolded = {tag_name: self.get_as_dict(child) for tag_name, child in tlv_element.__children().items()}
         return unfolded or tlv_element
 
     def get_as_hex_str(self):
@@ -249,41 +695,213 @@ class BerTlvElement():
         lb = length.to_bytes((length.bit_length() + 7) // 8, 'big')
         return bytes([0x80 | len(lb)]) + lb
 
-    def __encode_child_elemens(self):
-        result = bytes()
-        for _, tlv_element in self.__children_tlvs.items():  # iterate items
-            result += tlv_element.encode()
-        return result
-
-    def encode(self):
-        # build first tag octet
-        first_byte = 0
-        first_byte = set_bit_range_from_int(first_byte, 6, self.tag_class.value)
-        is_constructed_now = (len(self.__children_tlvs) > 0) or self.is_constructed
+    def __encoded_tag(self, is_constructed_now):
+        # build first tag octet; usually it matches the stored tag and the interned bytes are reused
+        first_byte = (self.tag_class.value << 6) | self.__tag_type_first_octet
         if is_constructed_now:
-            first_byte = set_bit_range_from_int(first_byte, 5, 1)
-        first_byte = set_bit_range_from_int(first_byte, 0, self.__tag_type_first_octet)
+            first_byte |= 0x20
         if self.__is_tag_long_form:
-            first_byte = set_bit_range_from_int(first_byte, 0, 31)
-
-        tag_bytes = bytes([first_byte]) + bytes(self.__tag_bytes[1:])
-
-        if is_constructed_now:
-            # encode children and set length from their total size
-            children_bytes = self.__encode_child_elemens()
-            self.__length_bytes = bytearray(self.__convert_int_length_to_tlv_bytes(len(children_bytes)))
-            return tag_bytes + bytes(self.__length_bytes) + children_bytes
-        else:
-            # primitive: set length from current value
-            self.__length_bytes = bytearray(self.__convert_int_length_to_tlv_bytes(len(self.__value_bytes)))
-            return tag_bytes + bytes(self.__length_bytes) + bytes(self.__value_bytes)
+            first_byte |= 0x1F
+        tag_bytes = self.__tag_bytes
+        if first_byte == tag_bytes[0] and isinstance(tag_bytes, bytes):
+            return tag_bytes
+        return bytes([first_byte]) + bytes(tag_bytes[1:])
+
+    def __measure(self, sizes):
+        # Sizing pass: content length of every dirty element in the subtree, keyed by id() (plus the
+        # spliced content of shallow copies, keyed by (id(), "parts")), and the encoded size of this
+        # element. Iterative (children before parents), like the parser.
+        if self.__encoded is not None:
+            return self.__encoded_end - self.__encoded_start
+        stack = [(self, False)]
+        while stack:
+            tlv_element, children_done = stack.pop()
+            children = tlv_element.__children()
+            if len(children) > 0 or tlv_element.is_constructed:
+                if not children_done:
+                    stack.append((tlv_element, True))
+                    parts = tlv_element.__spliced_parts() if tlv_element.__splice is not None else None
+                    if parts is None:
+                        stack.extend((child, False) for child in children.values() if child.__encoded is None)
+                    else:
+                        # shallow copy: only the changed children are visited, see __spliced_parts()
+                        sizes[id(tlv_element), "parts"] = parts
+                        stack.extend((child, False) for child, _ in parts
+                                     if child is not None and child.__encoded is None)
+                    continue
+                parts = sizes.get((id(tlv_element), "parts"))
+                if parts is None:
+                    sizes[id(tlv_element)] = sum(child.__size(sizes) for child in children.values())
+                else:
+                    sizes[id(tlv_element)] = sum(len(run) if child is None else child.__size(sizes)
+                                                 for child, run in parts)
+            else:
+                sizes[id(tlv_element)] = len(tlv_element.__value())
+        return self.__size(sizes)
+
+    def __size(self, sizes):
+        # encoded size: cached span, or header + content length measured by __measure()
+        if self.__encoded is not None:
+            return self.__encoded_end - self.__encoded_start
+        content = sizes[id(self)]
+        if self.__is_length_indefinite and (self.is_constructed or len(self.__children()) > 0):
+            return len(self.__tag_bytes) + 1 + content + 2
+        return len(self.__tag_bytes) + (1 if content <= 127 else 1 + (content.bit_length() + 7) // 8) + content
+
+    def __write(self, buf, offset, sizes, written):
+        # Pre-order write of the dirty elements, again on an explicit stack. An entry with a start
+        # offset closes a constructed element once its children are written; an entry without an
+        # element is a run of octets spliced from a source encoding.
+        stack = [(self, None)]
+        while stack:
+            tlv_element, start = stack.pop()
+            if tlv_element is None:
+                buf[offset:offset + len(start)] = start
+                offset += len(start)
+                continue
+            if start is not None:
+                if tlv_element.__is_length_indefinite:
+                    buf[offset:offset + 2] = _END_OF_CONTENTS
+                    offset += 2
+                written.append((tlv_element, start, offset))
+                continue
+
+            if tlv_element.__encoded is not None:
+                # clean subtree: copy the cached encoding as is
+                end = offset + (tlv_element.__encoded_end - tlv_element.__encoded_start)
+                buf[offset:end] = memoryview(tlv_element.__encoded)[tlv_element.__encoded_start:tlv_element.__encoded_end]
+                offset = end
+                continue
+
+            start = offset
+            children = tlv_element.__children()
+            is_constructed_now = len(children) > 0 or tlv_element.is_constructed
+            content = sizes[id(tlv_element)]
+            indefinite = is_constructed_now and tlv_element.__is_length_indefinite
+            tag_bytes = tlv_element.__encoded_tag(is_constructed_now)
+            length_bytes = _INDEFINITE_LENGTH if indefinite else tlv_element.__convert_int_length_to_tlv_bytes(content)
+            tlv_element.__length_bytes = _length_octets(content)
+
+            end = offset + len(tag_bytes)
+            buf[offset:end] = tag_bytes
+            offset, end = end, end + len(length_bytes)
+            buf[offset:end] = length_bytes
+            if is_constructed_now:
+                offset = end
+                stack.append((tlv_element, start))
+                parts = sizes.get((id(tlv_element), "parts"))
+                if parts is None:
+                    stack.extend((child, None) for child in reversed(children.values()))
+                else:
+                    stack.extend(reversed(parts))
+            else:
+                offset, end = end, end + content
+                buf[offset:end] = tlv_element.__value()
+                written.append((tlv_element, start, end))
+                offset = end
+        return offset
+
+    def get_encoded_length(self):
+        return self.__measure({})
+
+    def encode_into(self, buf, offset=0):
+        # Encode into a caller-owned bytearray/memoryview at offset; returns the offset just past it.
+        # Elements re-encoded here cache a private snapshot, never a reference to buf.
+        sizes, written = {}, []
+        total = self.__measure(sizes)
+        if offset + total > len(buf):
+            raise ValueError(f"Buffer too small: need {offset + total} bytes, have {len(buf)}")
+        end = self.__write(buf, offset, sizes, written)
+        if written:
+            self.__cache(bytes(buf[offset:end]), written, offset)
+        return end
 
-    def get_as_xml_str(self):
-        # TODO: Implement this if needed
-        pass
+    def encode(self):
+        # One sizing pass, then tag/length/value written into a single pre-sized buffer.
+        # Every element keeps its span of the result, so after a mutation only the dirty path
+        # from the changed element up to the root is re-encoded; clean subtrees are copied.
+        if self.__encoded is not None:
+            if self.__encoded_start == 0 and self.__encoded_end == len(self.__encoded):
+                return self.__encoded
+            return self.__encoded[self.__encoded_start:self.__encoded_end]
+        sizes, written = {}, []
+        buf = bytearray(self.__measure(sizes))
+        self.__write(buf, 0, sizes, written)
+        encoded = bytes(buf)
+        self.__cache(encoded, written, 0)
+        return encoded
+
+    @staticmethod
+    def __cache(encoded, written, base):
+        # written lists children before their parents. As for digests, values aliasing a writable
+        # caller buffer can change behind the element, so those leaves and their ancestors are not
+        # cached (an element is only cached if its whole subtree is).
+        uncacheable = set()
+        for tlv_element, start, end in written:
+            if id(tlv_element) in uncacheable:
+                continue
+            value_bytes = tlv_element.__value_bytes
+            if isinstance(value_bytes, memoryview) and not value_bytes.readonly and not tlv_element.__children():
+                node = tlv_element
+                while node is not None and id(node) not in uncacheable:
+                    uncacheable.add(id(node))
+                    node = node.__parent
+                continue
+            tlv_element.__encoded = encoded
+            tlv_element.__encoded_start = start - base
+            tlv_element.__encoded_end = end - base
+
+    def write_json(self, fp, indent=None):
+        # streams to fp (anything with write(str)) without building get_as_dict() first
+        write_tree(self, BerTlvJsonWriter(fp, indent))
+
+    def write_xml(self, fp, indent=None):
+        write_tree(self, BerTlvXmlWriter(fp, indent))
+
+    def get_as_json(self, indent=None):
+        out = io.StringIO()
+        self.write_json(out, indent)
+        return out.getvalue()
+
+    def get_as_xml_str(self, indent=None):
+        out = io.StringIO()
+        self.write_xml(out, indent)
+        return out.getvalue()
 
 
 class BerTlvParser():
+    def __init__(self, lazy=False, stats=None, limits=None):
+        # lazy: constructed elements keep their value span and decode children on first access
+        # limits: BerTlvLimits for untrusted input (needs eager parsing, so not with lazy)
+        if lazy and limits is not None:
+            raise ValueError("limits cannot be enforced on lazily parsed children")
+        self.lazy = lazy
+        self.stats = stats
+        self.limits = limits
+        self.reset()
+
+    @property
+    def limits(self):
+        return self.__limits
+
+    @limits.setter
+    def limits(self, limits):
+        # assignable after construction; the parse loop is re-picked so every entry point applies them
+        if self.lazy and limits is not None:
+            raise ValueError("limits cannot be enforced on lazily parsed children")
+        self.__limits = limits
+        self.__pick_range_parser()
+
+    def set_stats(self, stats):
+        # stats: BerTlvStats (see TlvStats.py) or None
+        self.stats = stats
+        self.__pick_range_parser()
+
+    def __pick_range_parser(self):
+        # a parser without stats or limits runs exactly the plain loop
+        self.__checked = self.stats is not None or self.__limits is not None
+        self.__range_parser = self.__parse_range_checked if self.__checked else self.__parse_range
+
     class state(Enum):
         EXPECTING_TAG              = 0,
         EXPECTING_TAG_NEXT_BYTE    = auto(),
@@ -295,71 +913,736 @@ class BerTlvParser():
     def changeParsingState(self, current_state, next_state):
         return next_state
 
-    def parse_tlv(self, bytesHexStr, parent_tlv=None):
-        b = binascii.unhexlify(bytesHexStr)
-        i = 0
-        result = [] if parent_tlv is None else None
-
-        while i < len(b):
-            # TAG (incl. long-form)
-            first = b[i]; i += 1
-            tlv_tag = BerTlvElement(first)
-            if tlv_tag.is_tag_long_form():
-                while True:
-                    nxt = b[i]; i += 1
-                    tnb = self.__parse_tag_next_byte(nxt)
-                    tlv_tag.add_tag_type_byte(tnb.tag_type)
-                    if not tnb.more:
-                        break
-
-            # LENGTH (short/long)
-            first_len = b[i]; i += 1
-            ln = self.__parse_length(first_len)
-            if ln.is_long_form:
-                tlv_tag.set_length_of_length(ln.length)
-                tlv_tag.clear_length_bytes()
-                for _ in range(ln.length):
-                    tlv_tag.add_length_byte(b[i]); i += 1
+    def reset(self):
+        # incremental (feed) parsing state
+        self.__state = BerTlvParser.state.EXPECTING_TAG
+        self.__header = bytearray()
+        self.__tag_end = 0
+        self.__length_bytes_left = 0
+        self.__value_left = 0
+        self.__value = bytearray()
+        # indefinite-length top-level element: nesting depth and where scanning resumes
+        self.__indefinite_depth = 0
+        self.__scan_pos = 0
+        # stream offset of the element being received (bytes of completed elements so far)
+        self.__fed = 0
+        # elements completed by a feed() call that then failed; returned by the next call
+        self.__completed = []
+
+    def __limit_exceeded(self, message):
+        offset = self.__fed
+        self.reset()
+        raise TlvDecodeError(message, offset)
+
+    def is_idle(self):
+        # True when no partially received element is buffered
+        return self.__state == BerTlvParser.state.EXPECTING_TAG
+
+    def close(self):
+        if not self.is_idle():
+            buffered = len(self.__header) + len(self.__value)
+            self.reset()
+            raise ValueError(f"Incomplete TLV at end of stream: {buffered} bytes buffered")
+
+    def feed(self, chunk):
+        # Push an arbitrary chunk of raw bytes and get back the top-level elements it completed.
+        # Headers are decoded byte by byte on the state machine, values are copied in bulk;
+        # bytes consumed by earlier calls are never looked at again.
+        # On a malformed element the parser is reset before the error is raised and the rest of the
+        # chunk is dropped; elements completed earlier in the call are returned by the next feed().
+        completed, self.__completed = self.__completed, []
+        try:
+            self.__consume(memoryview(chunk).cast("B"), completed)
+        except Exception:
+            self.reset()
+            self.__completed = completed
+            raise
+        return completed
+
+    def __consume(self, data, completed):
+        S = BerTlvParser.state
+        i, n = 0, len(data)
+        while i < n:
+            state = self.__state
+            if state in (S.EXPECTING_VALUE, S.EXPECTING_VALUE_NEXT_BYTE) and self.__indefinite_depth:
+                # no length to count down: buffer what we have and look for the end-of-contents
+                self.__value += data[i:n]; i = n
+                if self.limits is not None and self.limits.max_size is not None \
+                        and len(self.__value) > self.limits.max_size:
+                    self.__limit_exceeded(f"Indefinite-length element exceeds {self.limits.max_size} bytes")
+                content_end = self.__scan_indefinite()
+                if content_end is None:
+                    self.__state = self.changeParsingState(state, S.EXPECTING_VALUE_NEXT_BYTE)
+                else:
+                    leftover = bytes(self.__value[content_end + 2:])
+                    del self.__value[content_end:]
+                    completed.append(self.__complete_element())
+                    data, i, n = memoryview(leftover), 0, len(leftover)
+                continue
+            if state in (S.EXPECTING_VALUE, S.EXPECTING_VALUE_NEXT_BYTE):
+                take = min(self.__value_left, n - i)
+                self.__value += data[i:i + take]; i += take
+                self.__value_left -= take
+                if self.__value_left:
+                    self.__state = self.changeParsingState(state, S.EXPECTING_VALUE_NEXT_BYTE)
+                else:
+                    completed.append(self.__complete_element())
+                continue
+
+            byte = data[i]; i += 1
+            self.__header.append(byte)
+            if state == S.EXPECTING_TAG:
+                next_state = S.EXPECTING_TAG_NEXT_BYTE if self.__parse_tag_first_byte(byte).is_long_form \
+                    else S.EXPECTING_LENGTH
+            elif state == S.EXPECTING_TAG_NEXT_BYTE:
+                next_state = S.EXPECTING_TAG_NEXT_BYTE if self.__parse_tag_next_byte(byte).more \
+                    else S.EXPECTING_LENGTH
+            elif state == S.EXPECTING_LENGTH:
+                self.__tag_end = len(self.__header) - 1
+                ln = self.__parse_length(byte)
+                if ln.is_long_form and ln.length:
+                    if self.limits is not None and self.limits.max_length_of_length is not None \
+                            and ln.length > self.limits.max_length_of_length:
+                        self.__limit_exceeded(f"Length of length {ln.length} exceeds "
+                                              f"{self.limits.max_length_of_length}")
+                    self.__length_bytes_left = ln.length
+                    self.__value_left = 0
+                    next_state = S.EXPECTING_LENGTH_NEXT_BYTE
+                elif ln.is_long_form:
+                    if not self.__header[0] & 0x20:
+                        self.reset()
+                        raise ValueError("Indefinite length on primitive tag")
+                    self.__indefinite_depth = 1
+                    self.__scan_pos = 0
+                    self.__value_left = 0
+                    next_state = S.EXPECTING_VALUE
+                else:
+                    self.__value_left = 0 if ln.is_long_form else ln.length
+                    next_state = S.EXPECTING_VALUE
+            else:  # EXPECTING_LENGTH_NEXT_BYTE
+                self.__value_left = (self.__value_left << 8) | byte
+                self.__length_bytes_left -= 1
+                next_state = S.EXPECTING_LENGTH_NEXT_BYTE if self.__length_bytes_left else S.EXPECTING_VALUE
+
+            if next_state == S.EXPECTING_VALUE and self.limits is not None and self.limits.max_size is not None \
+                    and self.__value_left > self.limits.max_size:
+                self.__limit_exceeded(f"Declared length {self.__value_left} exceeds {self.limits.max_size}")
+            self.__state = self.changeParsingState(state, next_state)
+            if next_state == S.EXPECTING_VALUE and not self.__value_left and not self.__indefinite_depth:
+                completed.append(self.__complete_element())
+
+    def __scan_indefinite(self):
+        # Hop over complete child headers in the buffered value, resuming where the last call stopped.
+        # Returns the offset of the closing end-of-contents, or None if more data is needed.
+        v, pos, depth = self.__value, self.__scan_pos, self.__indefinite_depth
+        n = len(v)
+        while pos + 2 <= n:
+            if v[pos] == 0 and v[pos + 1] == 0:
+                pos += 2
+                depth -= 1
+                if depth == 0:
+                    self.__indefinite_depth = 0
+                    return pos - 2
+                continue
+            try:
+                _, _, value_offset, length, _ = self.__read_header(v, pos, n)
+            except IndexError:
+                break   # header not fully received yet
+            if length is None:
+                if not v[pos] & 0x20:
+                    self.reset()
+                    raise ValueError("Indefinite length on primitive tag")
+                depth += 1
+                pos = value_offset
+            else:
+                pos = value_offset + length
+        self.__scan_pos, self.__indefinite_depth = pos, depth
+        return None
+
+    def __complete_element(self):
+        header, value = self.__header, self.__value
+        start = self.__fed
+        self.__fed += len(header) + len(value) + (2 if header[self.__tag_end] == 0x80 else 0)
+        tlv_tag = BerTlvElement(bytes(header[:self.__tag_end]))
+        length_bytes = header[self.__tag_end + 1:]
+        if header[self.__tag_end] == 0x80:
+            tlv_tag.set_length_indefinite(True)
+            tlv_tag.set_length_bytes(_length_octets(len(value)))
+        elif self.__parse_length(header[self.__tag_end]).is_long_form:
+            tlv_tag.set_length_of_length(len(length_bytes))
+            tlv_tag.set_length_bytes(length_bytes)
+        else:
+            tlv_tag.set_length(header[self.__tag_end])
+        # read-only, so digests of fed elements can be cached (see get_digest)
+        view = memoryview(value).toreadonly()
+        tlv_tag.set_value_view(view)
+        if tlv_tag.is_constructed:
+            if self.lazy:
+                tlv_tag.set_children_loader(self.__load_children)
             else:
-                tlv_tag.set_length(ln.length)
+                try:
+                    self.__range_parser(view, 0, len(view), tlv_tag)
+                except TlvDecodeError as e:
+                    # nested offsets count from the start of the value; report stream offsets
+                    raise TlvDecodeError(e.reason, start + len(header) + e.offset) from None
+                except (IndexError, ValueError, LookupError) as e:
+                    # no structured offset to shift; point at the element and chain the cause
+                    raise TlvDecodeError(f"Malformed value of tag {tlv_tag.get_tag().hex().upper()}", start) from e
+        if self.stats is not None:
+            self.stats.element_parsed(tlv_tag, 0)
+            self.stats.message_parsed(tlv_tag, len(header) + len(value))
+        self.__state = self.changeParsingState(self.__state, BerTlvParser.state.EXPECTING_TAG)
+        self.__header = bytearray()
+        self.__value = bytearray()
+        return tlv_tag
+
+    def parse_many(self, messages, workers=None, chunksize=256, paths=None, compact=False):
+        # Parse an iterable of messages (str: hex, bytes-like: raw) on a process pool and yield the
+        # results in input order. Messages travel in chunks of `chunksize` per task so IPC does not
+        # dominate, and only a bounded number of chunks is in flight at a time.
+        # Results are BerTlv trees (or None for an empty message), or, cheaper to ship back:
+        #   paths=[...]   -> {path: value bytes or None} for each path (see BerTlvExtractor)
+        #   compact=True  -> {full path: value bytes} for every primitive element
+        # workers=0 parses in the calling process, with this parser. Workers use a parser configured
+        # like this one (lazy, limits, stats); their counters are merged into self.stats, but stats
+        # hooks only fire for messages parsed in this process.
+        mode = "paths" if paths else "compact" if compact else "tlv"
+        paths = list(paths) if paths else None
+        messages = iter(messages)
+        chunks = iter(lambda: [bytes(m) if isinstance(m, memoryview) else m
+                               for m in islice(messages, chunksize)], [])
+        if workers == 0:
+            for chunk in chunks:
+                yield from _parse_messages(self, mode, paths, chunk)
+            return
+        config = (self.lazy, self.limits, None if self.stats is None else self.stats.timing)
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            in_flight = deque()
+            for chunk in chunks:
+                in_flight.append(pool.submit(_parse_chunk, (mode, paths, config, chunk)))
+                if len(in_flight) >= workers * 2:
+                    yield from self.__chunk_done(mode, in_flight.popleft().result())
+            while in_flight:
+                yield from self.__chunk_done(mode, in_flight.popleft().result())
+
+    def __chunk_done(self, mode, done):
+        results, stats = done
+        if self.stats is not None:
+            self.stats.merge(stats)
+            if mode == "tlv":
+                for tlv in results:
+                    if tlv is not None:
+                        tlv.set_stats(self.stats)
+        return results
 
-            L = tlv_tag.get_length()
+    def parse_tlv(self, bytesHexStr, parent_tlv=None):
+        return self.parse_tlv_bytes(binascii.unhexlify(bytesHexStr), parent_tlv)
+
+    def parse_tlv_bytes(self, data, parent_tlv=None):
+        # Accepts raw bytes/bytearray/memoryview. The buffer is walked once by offsets and
+        # element values are memoryview slices of it, so nothing is copied or re-hexed.
+        buf = memoryview(data)
+        if buf.format != "B" or buf.ndim != 1:
+            buf = buf.cast("B")
+        if not self.__checked:
+            return self.__parse_range(buf, 0, len(buf), parent_tlv)
+
+        if self.limits is not None and self.limits.max_size is not None and len(buf) > self.limits.max_size:
+            raise TlvDecodeError(f"Input of {len(buf)} bytes exceeds {self.limits.max_size}", 0)
+        stats = self.stats
+        if stats is None:
+            return self.__parse_range_checked(buf, 0, len(buf), parent_tlv)
+        started = stats.clock() if stats.timing else 0.0
+        parsed = self.__parse_range_checked(buf, 0, len(buf), parent_tlv)
+        if isinstance(parsed, BerTlv):
+            parsed.set_stats(stats)
+        stats.message_parsed(parsed, len(buf), stats.clock() - started if stats.timing else 0.0)
+        return parsed
+
+    def parse_tlv_projection(self, data, wanted):
+        # Parse only what can lead to a wanted tag or path and jump over everything else by its length.
+        # wanted: BerTlvPathSet or iterable of paths ("6F/A5/87", "*/9F02", "**/5F2A"), read as by
+        # BerTlvPathSet. Wanted elements are parsed in full, their ancestors keep only the children
+        # on a wanted path, so encode() of an ancestor covers just those.
+        if not isinstance(wanted, BerTlvPathSet):
+            wanted = BerTlvPathSet(wanted)
+        buf = memoryview(data)
+        if buf.format != "B" or buf.ndim != 1:
+            buf = buf.cast("B")
+        if self.limits is not None and self.limits.max_size is not None and len(buf) > self.limits.max_size:
+            raise TlvDecodeError(f"Input of {len(buf)} bytes exceeds {self.limits.max_size}", 0)
+        return self.__parse_projected(buf, 0, len(buf), wanted)
+
+    def write_json(self, data, fp, indent=None):
+        # Export raw BER-TLV bytes as JSON straight from the buffer, no elements are built
+        self.export(data, BerTlvJsonWriter(fp, indent))
+
+    def write_xml(self, data, fp, indent=None):
+        self.export(data, BerTlvXmlWriter(fp, indent))
+
+    def export(self, data, writer):
+        # Walk the buffer header by header and send writer events (see TlvExport.py)
+        b = memoryview(data)
+        if b.format != "B" or b.ndim != 1:
+            b = b.cast("B")
+        writer.begin()
+        stack = [[0, len(b)]]   # [next offset, end] of every open constructed value
+        while stack:
+            span = stack[-1]
+            if span[0] >= span[1]:
+                stack.pop()
+                if stack:
+                    writer.end()
+                continue
+            i = span[0]
+            _, tag_end, value_offset, length, _ = self.__read_header(b, i, span[1])
+            value_end, span[0] = self.__value_span(b, i, value_offset, length, span[1])
+            tag_name = b[i:tag_end].hex().upper()
+            if b[i] & 0x20:
+                writer.start(tag_name)
+                stack.append([value_offset, value_end])
+            else:
+                writer.value(tag_name, b[value_offset:value_end])
+        writer.finish()
+
+    def patch_value(self, buf, path, value):
+        # Replace the value of the element at path ("77/9F36") inside an encoded bytearray, in place.
+        # Only the length fields of the element and its ancestors are rewritten; their form and
+        # size are kept whenever the new length fits, so bytes after the value move only when the
+        # value size or a length-of-length changes. Indefinite-length ancestors need no update.
+        # Returns the change in buffer size. Trees parsed from buf view it, so a resize raises
+        # BufferError while one is alive. A path that is not in buf, or that continues below a
+        # primitive element, raises LookupError.
+        if not isinstance(buf, bytearray):
+            raise TypeError("patch_value() needs a bytearray")
+        segments = path.upper().split(PATH_SEPARATOR)
+        if len(segments) > 1 and segments[0] == "FF":
+            segments = segments[1:]
+
+        # locate: one header hop per sibling, descend on each matching segment
+        ancestors = []   # (tag end, value offset, length or None) from the outside in
+        i, end = 0, len(buf)
+        for depth, segment in enumerate(segments):
+            while True:
+                if i >= end:
+                    raise LookupError(f"Tag {segment} not found at {PATH_SEPARATOR.join(segments[:depth + 1])}")
+                _, tag_end, value_offset, length, _ = self.__read_header(buf, i, end)
+                value_end, next_offset = self.__value_span(buf, i, value_offset, length, end)
+                if buf[i:tag_end].hex().upper() == segment:
+                    break
+                i = next_offset
+            if depth < len(segments) - 1 and not buf[i] & 0x20:
+                raise LookupError(f"Tag {segment} at {PATH_SEPARATOR.join(segments[:depth + 1])} is primitive "
+                                  f"and has no children")
+            ancestors.append((tag_end, value_offset, length))
+            i, end = value_offset, value_end
+
+        # splice the value, then fix lengths from the innermost element outwards
+        tag_end, value_offset, length = ancestors[-1]
+        if length is None:
+            raise ValueError(f"Cannot patch the indefinite-length element at {path}")
+        buf[value_offset:value_offset + length] = value
+        delta = len(value) - length
+        for tag_end, value_offset, length in reversed(ancestors):
+            if not delta:
+                break   # sizes unchanged from here on out
+            if length is None:
+                continue   # closed by end-of-contents, nothing to count
+            old_field = value_offset - tag_end
+            new_field = self.__length_field(length + delta, old_field)
+            buf[tag_end:value_offset] = new_field
+            delta += len(new_field) - old_field
+        return delta
+
+    def __length_field(self, length, old_size):
+        # Length field for length, reusing the old field size if the length still fits in it
+        if old_size == 1 and length <= 127:
+            return bytes([length])
+        if old_size > 1 and length < 1 << (8 * (old_size - 1)):
+            return bytes([0x80 | (old_size - 1)]) + length.to_bytes(old_size - 1, "big")
+        octets = _length_octets(length)
+        return octets if length <= 127 else bytes([0x80 | len(octets)]) + octets
+
+    def parse_header(self, data, offset=0, end=None):
+        # Decode just the tag and length at offset of any indexable byte buffer (bytes, memoryview, mmap).
+        # length is None for an indefinite-length (0x80) element.
+        return Header(*self.__read_header(data, offset, len(data) if end is None else end)[:4])
+
+    def scan(self, data):
+        # Structure-only pass: validates the encoding and returns a BerTlvScan offsets table,
+        # without building any BerTlvElement. Walks with an explicit stack, so depth costs no recursion.
+        # Unlike parse_tlv_bytes(), a length running past its container is an error, not clamped.
+        b = memoryview(data)
+        if b.format != "B" or b.ndim != 1:
+            b = b.cast("B")
+        table = BerTlvScan(b)
+        depths, tags, headers, values, lengths, parents = (table.depth, table.tag, table.header_offset,
+                                                           table.value_offset, table.length, table.parent)
+        stack = []
+        i, end, parent, depth = 0, len(b), -1, 0
+        while True:
+            if i >= end:
+                if not stack:
+                    return table
+                i, end, parent, depth = stack.pop()
+                continue
+            try:
+                tag, tag_end, value_offset, length, _ = self.__read_header(b, i, end)
+            except IndexError:
+                raise TlvDecodeError("Truncated header", i) from None
+            if length is None:
+                if not b[i] & 0x20:
+                    raise TlvDecodeError("Indefinite length on primitive tag", i)
+                try:
+                    value_end = self.__find_end_of_contents(b, value_offset, end)
+                except IndexError:
+                    raise TlvDecodeError("Missing end-of-contents", i) from None
+                next_offset = value_end + 2
+            else:
+                value_end = next_offset = value_offset + length
+                if value_end > end:
+                    raise TlvDecodeError(f"Length {length} of tag {tag:X} overruns its container ending at {end}", i)
+            try:
+                tags.append(tag)
+            except OverflowError:
+                raise TlvDecodeError("Tag longer than 8 bytes", i) from None
+            depths.append(depth)
+            headers.append(i)
+            values.append(value_offset)
+            lengths.append(value_end - value_offset)
+            parents.append(parent)
+            if b[i] & 0x20 and value_end > value_offset:
+                stack.append((next_offset, end, parent, depth))
+                i, end, parent, depth = value_offset, value_end, len(tags) - 1, depth + 1
+            else:
+                i = next_offset
+
+    def skip_element(self, data, offset=0, end=None):
+        # Offset just past the element at offset, including the end-of-contents of indefinite lengths.
+        end = len(data) if end is None else end
+        _, _, value_offset, length, _ = self.__read_header(data, offset, end)
+        if length is None:
+            return self.__find_end_of_contents(data, value_offset, end) + 2
+        return value_offset + length
+
+    def __find_end_of_contents(self, b, i, end):
+        # offset of the 00 00 that closes the indefinite-length value starting at i
+        depth = 1
+        while True:
+            if i + 2 > end:
+                raise IndexError(f"Missing end-of-contents before offset {end}")
+            if b[i] == 0 and b[i + 1] == 0:
+                depth -= 1
+                if depth == 0:
+                    return i
+                i += 2
+                continue
+            _, _, value_offset, length, _ = self.__read_header(b, i, end)
+            if length is None:
+                depth += 1
+                i = value_offset
+            else:
+                i = value_offset + length
+
+    def __value_span(self, b, i, value_offset, length, end):
+        # -> (value end, offset of the next element)
+        if length is None:
+            if not b[i] & 0x20:
+                raise ValueError(f"Indefinite length on primitive tag at offset {i}")
+            content_end = self.__find_end_of_contents(b, value_offset, end)
+            return content_end, content_end + 2
+        # a declared length past the end is clamped, as before
+        value_end = min(value_offset + length, end)
+        return value_end, value_end
+
+    def __read_header(self, b, i, end):
+        # -> (tag as int, offset after tag, value offset, length or None if indefinite, long-form length)
+        tag_start = i
+        tag = b[i]; i += 1
+        if _TAG_IS_LONG_FORM[tag]:
+            while True:
+                if i >= end:
+                    raise IndexError(f"Truncated tag at offset {tag_start}")
+                nxt = b[i]; i += 1
+                tag = (tag << 8) | nxt
+                if not _TAG_HAS_MORE[nxt]:
+                    break
+        tag_end = i
+
+        if i >= end:
+            raise IndexError(f"Missing length at offset {i}")
+        length = b[i]; i += 1
+        if not _LENGTH_IS_LONG_FORM[length]:
+            return tag, tag_end, i, length, False
+        length_of_length = length & 0x7F
+        if length_of_length == 0:
+            return tag, tag_end, i, None, True
+        if i + length_of_length > end:
+            raise IndexError(f"Truncated length at offset {i - 1}")
+        length = int.from_bytes(b[i:i + length_of_length], "big")
+        return tag, tag_end, i + length_of_length, length, True
+
+    def __new_element(self, b, tag, tag_end, value_offset, value_end, is_long_form):
+        tlv_tag = BerTlvElement(tag)
+        if value_offset == tag_end + 1 and b[tag_end] == 0x80:
+            tlv_tag.set_length_indefinite(True)
+            tlv_tag.set_length_bytes(_length_octets(value_end - value_offset))
+        elif is_long_form:
+            tlv_tag.set_length_of_length(value_offset - tag_end - 1)
+            tlv_tag.set_length_bytes(b[tag_end + 1:value_offset])
+        else:
+            tlv_tag.set_length(b[tag_end])
+        tlv_tag.set_value_view(b, value_offset, value_end)
+        return tlv_tag
 
-            # VALUE
-            val = b[i:i + L]; i += L
-            tlv_tag.set_value_bytes(val)
+    def __parse_range(self, b, start, end, parent_tlv=None):
+        # Explicit stack instead of recursion: nesting depth is bounded by memory, not the interpreter.
+        # stack holds (next sibling offset, container end, parent) of every open constructed element.
+        result = [] if parent_tlv is None else None
+        stack = []
+        i, parent = start, parent_tlv
+
+        while True:
+            if i >= end:
+                if not stack:
+                    break
+                i, end, parent = stack.pop()
+                continue
+
+            # TAG (incl. long-form) and LENGTH (short/long)
+            tag, tag_end, value_offset, length, is_long_form = self.__read_header(b, i, end)
+
+            # VALUE (definite, or up to the end-of-contents octets)
+            value_end, next_offset = self.__value_span(b, i, value_offset, length, end)
+            tlv_tag = self.__new_element(b, tag, tag_end, value_offset, value_end, is_long_form)
+
+            # attach to parent or top-level result
+            if parent is not None:
+                parent.add_child(tlv_tag)
+            else:
+                result.append(tlv_tag)
+            i = next_offset
 
-            # recurse if constructed
+            # descend into the same buffer if constructed (or defer it in lazy mode)
             if tlv_tag.is_constructed:
-                self.parse_tlv(tlv_tag.get_value_as_hex_str(), tlv_tag)
+                if self.lazy:
+                    tlv_tag.set_children_loader(self.__load_children)
+                else:
+                    stack.append((i, end, parent))
+                    i, end, parent = value_offset, value_end, tlv_tag
+
+        # returns
+        if parent_tlv is not None:
+            return parent_tlv
+        if not result:
+            return None
+        return BerTlv(result if len(result) > 1 else result[0])
 
-            # attach to parent or top-level result  (this was missing in your failing run)
-            if parent_tlv is not None:
-                parent_tlv.add_child(tlv_tag)
+    def __parse_range_checked(self, b, start, end, parent_tlv=None):
+        # __parse_range() plus BerTlvStats bookkeeping and BerTlvLimits checks; kept separate so the
+        # plain loop pays for neither. Limits make malformed lengths errors instead of clamping them.
+        stats, limits = self.stats, self.limits
+        timing = stats is not None and stats.timing
+        clock = stats.clock if timing else None
+        if limits is not None:
+            max_depth, max_elements, max_length_of_length = (
+                sys.maxsize if limit is None else limit
+                for limit in (limits.max_depth, limits.max_elements, limits.max_length_of_length))
+        else:
+            max_depth = max_elements = max_length_of_length = sys.maxsize
+        base_depth = 0 if parent_tlv is None else self.__depth(parent_tlv) + 1
+        count = 0
+        result = [] if parent_tlv is None else None
+        stack = []
+        i, parent = start, parent_tlv
+
+        while True:
+            if i >= end:
+                if not stack:
+                    break
+                i, end, parent = stack.pop()
+                continue
+
+            depth = base_depth + len(stack)
+            if depth > max_depth:
+                raise TlvDecodeError(f"Nesting deeper than {max_depth} levels", i)
+            count += 1
+            if count > max_elements:
+                raise TlvDecodeError(f"More than {max_elements} elements", i)
+
+            if timing:
+                t0 = clock()
+            try:
+                tag, tag_end, value_offset, length, is_long_form = self.__read_header(b, i, end)
+            except IndexError:
+                if limits is None:
+                    raise
+                raise TlvDecodeError("Truncated header", i) from None
+            if limits is not None:
+                if is_long_form and value_offset - tag_end - 1 > max_length_of_length:
+                    raise TlvDecodeError(f"Length of length {value_offset - tag_end - 1} exceeds "
+                                         f"{max_length_of_length}", i)
+                if length is not None and value_offset + length > end:
+                    raise TlvDecodeError(f"Length {length} of tag {tag:X} overruns its container ending at {end}", i)
+            if timing:
+                t1 = clock()
+                stats.add_phase("header", t1 - t0)
+            if limits is not None and length is None and not b[i] & 0x20:
+                raise TlvDecodeError("Indefinite length on primitive tag", i)
+            try:
+                value_end, next_offset = self.__value_span(b, i, value_offset, length, end)
+            except IndexError:
+                if limits is None:
+                    raise
+                raise TlvDecodeError("Missing end-of-contents", i) from None
+            tlv_tag = self.__new_element(b, tag, tag_end, value_offset, value_end, is_long_form)
+            if timing:
+                stats.add_phase("value", clock() - t1)
+            if stats is not None:
+                stats.element_parsed(tlv_tag, depth)
+
+            if parent is not None:
+                if timing:
+                    t2 = clock()
+                    parent.add_child(tlv_tag)
+                    stats.add_phase("attach", clock() - t2)
+                else:
+                    parent.add_child(tlv_tag)
             else:
                 result.append(tlv_tag)
+            i = next_offset
+
+            if tlv_tag.is_constructed:
+                if self.lazy:
+                    tlv_tag.set_children_loader(self.__load_children)
+                else:
+                    stack.append((i, end, parent))
+                    i, end, parent = value_offset, value_end, tlv_tag
 
-        # returns
         if parent_tlv is not None:
             return parent_tlv
         if not result:
             return None
         return BerTlv(result if len(result) > 1 else result[0])
 
+    def __depth(self, tlv_element):
+        # nesting depth of an already attached element, 0 = top level
+        depth = 0
+        parent = tlv_element.get_parent()
+        while parent is not None and not parent.is_dummy:
+            depth += 1
+            parent = parent.get_parent()
+        return depth
+
+    def __parse_projected(self, b, start, end, wanted):
+        # Same explicit stack and limits as __parse_range_checked(). state is the path set DFA state,
+        # or None inside a wanted element, where everything is kept. stack holds (next sibling offset,
+        # container end, parent, state, pending) per open element; pending is a container on the way
+        # to a wanted path, attached to its parent only if it kept any children.
+        limits = self.limits
+        if limits is not None:
+            max_depth, max_elements, max_length_of_length = (
+                sys.maxsize if limit is None else limit
+                for limit in (limits.max_depth, limits.max_elements, limits.max_length_of_length))
+        result = []
+        stack = []
+        count = 0
+        i, parent, state = start, None, wanted.start
+
+        while True:
+            if i >= end:
+                if not stack:
+                    break
+                tlv_tag = parent
+                i, end, parent, state, pending = stack.pop()
+                if pending and len(tlv_tag.iter_children()):
+                    if parent is not None:
+                        parent.add_child(tlv_tag)
+                    else:
+                        result.append(tlv_tag)
+                continue
+
+            if limits is None:
+                tag, tag_end, value_offset, length, is_long_form = self.__read_header(b, i, end)
+                value_end, next_offset = self.__value_span(b, i, value_offset, length, end)
+            else:
+                if len(stack) > max_depth:
+                    raise TlvDecodeError(f"Nesting deeper than {max_depth} levels", i)
+                count += 1
+                if count > max_elements:
+                    raise TlvDecodeError(f"More than {max_elements} elements", i)
+                try:
+                    tag, tag_end, value_offset, length, is_long_form = self.__read_header(b, i, end)
+                except IndexError:
+                    raise TlvDecodeError("Truncated header", i) from None
+                if is_long_form and value_offset - tag_end - 1 > max_length_of_length:
+                    raise TlvDecodeError(f"Length of length {value_offset - tag_end - 1} exceeds "
+                                         f"{max_length_of_length}", i)
+                if length is not None and value_offset + length > end:
+                    raise TlvDecodeError(f"Length {length} of tag {tag:X} overruns its container ending at {end}", i)
+                if length is None and not b[i] & 0x20:
+                    raise TlvDecodeError("Indefinite length on primitive tag", i)
+                try:
+                    value_end, next_offset = self.__value_span(b, i, value_offset, length, end)
+                except IndexError:
+                    raise TlvDecodeError("Missing end-of-contents", i) from None
+
+            if state is None:
+                next_state = None
+            else:
+                next_state = wanted.step_tag(state, tag, tag_end - i)
+                if next_state.accepts:
+                    next_state = None
+                elif not (next_state.alive and b[i] & 0x20):
+                    i = next_offset   # nothing wanted in here: skip without building anything
+                    continue
+
+            tlv_tag = self.__new_element(b, tag, tag_end, value_offset, value_end, is_long_form)
+            pending = next_state is not None
+            if not pending:
+                # wanted, or inside a wanted element: kept as is
+                if parent is not None:
+                    parent.add_child(tlv_tag)
+                else:
+                    result.append(tlv_tag)
+            i = next_offset
+            if tlv_tag.is_constructed:
+                if not pending and self.lazy:
+                    tlv_tag.set_children_loader(self.__load_children)
+                else:
+                    stack.append((i, end, parent, state, pending))
+                    i, end, parent, state = value_offset, value_end, tlv_tag, next_state
+
+        if not result:
+            return None
+        return BerTlv(result if len(result) > 1 else result[0])
+
+    def __load_children(self, tlv_element):
+        view = tlv_element.get_value_view()
+        self.__range_parser(view, 0, len(view), tlv_element)
+
+    def __parse_tag_first_byte(self, byte):
+        return _TAG_FIRST_OCTET[byte]
+
     def __parse_tag_next_byte(self, byte):
-        more = (1 == get_bit_range_as_int(byte, 7, 8))
-        tag_type = get_bit_range_as_int(byte, 0, 8)
-        return TagTypeBytes(more, tag_type)
+        return _TAG_NEXT_OCTET[byte]
 
     def __parse_length(self, byte):
-        is_long_form = (1 == get_bit_range_as_int(byte, 7, 8))
-        length = get_bit_range_as_int(byte, 0, 7)
-        return Length(is_long_form, length)
+        return _LENGTH_OCTET[byte]
 
 
 class BerTlv():
-    def __init__(self, data):
+    def __init__(self, data, index=False):
         self.tlv_elements = OrderedDict()
+        # opt-in path index: full upper-case path -> element, built on first find()
+        self.index = index
+        self.__path_index = None
+        self.__element_paths = None
+        # paths of indexed elements whose children are not (lazy parse: not yet decoded)
+        self.__unexpanded = None
+        # optional BerTlvStats counting find() lookups
+        self.stats = None
         if isinstance(data, (str, bytes)):
             parser = BerTlvParser()
             parsed = parser.parse_tlv(data)
@@ -392,10 +1675,120 @@ class BerTlv():
             first_key = next(iter(self.tlv_elements))
             return self.tlv_elements[first_key]
 
+    def __getstate__(self):
+        # the index is keyed by id() and rebuilt on demand after unpickling
+        state = self.__dict__.copy()
+        state["_BerTlv__path_index"] = None
+        state["_BerTlv__element_paths"] = None
+        state["_BerTlv__unexpanded"] = None
+        state["stats"] = None
+        return state
+
+    def set_stats(self, stats):
+        self.stats = stats
+
+    def build_index(self):
+        # Index every element by its full path. add_child()/insert_tlv_element() keep it current.
+        # Children a lazy parse has not decoded yet are indexed when a lookup first reaches them,
+        # so the index never decodes subtrees that find() does not ask for.
+        self.index = True
+        self.__path_index = {}
+        self.__element_paths = {}
+        self.__unexpanded = set()
+        for tag_name, tlv_element in self.tlv_elements.items():
+            self.__index_subtree(tag_name, tlv_element)
+
+    def drop_index(self):
+        if self.__path_index is not None:
+            for tlv_element in self.__path_index.values():
+                tlv_element.set_observer(None)
+        self.index = False
+        self.__path_index = None
+        self.__element_paths = None
+        self.__unexpanded = None
+
+    def __index_subtree(self, path, tlv_element):
+        stack = [(path, tlv_element)]
+        while stack:
+            path, tlv_element = stack.pop()
+            self.__path_index[path] = tlv_element
+            self.__element_paths[id(tlv_element)] = path
+            tlv_element.set_observer(self)
+            if not tlv_element.is_materialized():
+                self.__unexpanded.add(path)
+                continue
+            for tag_name, child in tlv_element.iter_children():
+                stack.append((path + PATH_SEPARATOR + tag_name, child))
+
+    def __expand(self, path_elems):
+        # index the lazily parsed levels on the way to path_elems; -> the element there, or None
+        tlv_element = None
+        for depth in range(1, len(path_elems) + 1):
+            path = PATH_SEPARATOR.join(path_elems[:depth])
+            tlv_element = self.__path_index.get(path)
+            if tlv_element is None:
+                return None
+            if path in self.__unexpanded and depth < len(path_elems):
+                self.__unexpanded.discard(path)
+                for tag_name, child in tlv_element.get_children().items():
+                    self.__index_subtree(path + PATH_SEPARATOR + tag_name, child)
+        return tlv_element
+
+    def __unindex_subtree(self, path):
+        prefix = path + PATH_SEPARATOR
+        for stale in [p for p in self.__path_index if p == path or p.startswith(prefix)]:
+            tlv_element = self.__path_index.pop(stale)
+            self.__element_paths.pop(id(tlv_element), None)
+            self.__unexpanded.discard(stale)
+
+    def child_added(self, parent, tag_name, child):
+        if self.__path_index is None:
+            return
+        if parent is None:
+            path = tag_name
+        else:
+            parent_path = self.__element_paths.get(id(parent))
+            if parent_path is None:
+                return
+            path = parent_path + PATH_SEPARATOR + tag_name
+        if path in self.__path_index:
+            self.__unindex_subtree(path)
+        self.__index_subtree(path, child)
+
+    def __find_indexed(self, path):
+        path_elems = path.split(PATH_SEPARATOR)
+        multi_root = len(self.tlv_elements) > 1
+        if multi_root and path_elems[0] == "FF":
+            path_elems = path_elems[1:]
+        if not path_elems:
+            return self.__wrap_with_dummy_tag().get_children()
+        hit = self.__path_index.get(PATH_SEPARATOR.join(path_elems))
+        if hit is None and self.__unexpanded:
+            hit = self.__expand(path_elems)
+        if hit is not None and not multi_root and len(path_elems) == 1:
+            # single root: find() resolves the root tag to its children
+            return hit.get_children()
+        return hit
+
     def find(self, path, _debug: bool = False):
+        if self.stats is None:
+            return self.__find(path, _debug)
+        stats = self.stats
+        started = stats.clock() if stats.timing else 0.0
+        result = self.__find(path, _debug)
+        stats.lookup_done(path, result, stats.clock() - started if stats.timing else 0.0)
+        return result
+
+    def __find(self, path, _debug):
         if not path:
             return None
         path = path.upper()
+        if self.index and len(self.tlv_elements) > 0:
+            if self.__path_index is None:
+                self.build_index()
+            if _debug:
+                print(f"[find] path={path} via index of {len(self.__path_index)} paths")
+            return self.__find_indexed(path)
         path_elems = path.split("/")
 
         root_tag = self.__wrap_with_dummy_tag()
@@ -464,7 +1857,15 @@ class BerTlv():
             if isinstance(find_rez, BerTlvElement):
                 find_rez.add_child(tlv_element)
             else:
-                find_rez[tlv_element.get_tag().hex()] = tlv_element
+                # find() returned the children of the single root or of the FF wrapper
+                root_tag = next(iter(self.tlv_elements.values()))
+                if len(self.tlv_elements) == 1 and find_rez is root_tag.get_children():
+                    root_tag.add_child(tlv_element)
+                else:
+                    tag_name = tlv_element.get_tag().hex().upper()
+                    self.tlv_elements[tag_name] = tlv_element
+                    if self.__path_index is not None:
+                        self.child_added(None, tag_name, tlv_element)
         else:
             raise LookupError(f"Unable to find path: {path}")
 
@@ -480,11 +1881,22 @@ class BerTlv():
     def create_tlv_element(self, tag_class, tag_type):
         pass
 
+    def get_encoded_length(self):
+        return sum(tlv_element.get_encoded_length() for tlv_element in self.tlv_elements.values())
+
+    def encode_into(self, buf, offset=0):
+        for tlv_element in self.tlv_elements.values():
+            offset = tlv_element.encode_into(buf, offset)
+        return offset
+
     def encode(self):
-        result = bytes()
-        for _, tlv_element in self.tlv_elements.items():
-            result += tlv_element.encode()
-        return result
+        # each root is sized and written once (and keeps its encoding cached); roots are then joined
+        encoded = [tlv_element.encode() for tlv_element in self.tlv_elements.values()]
+        return encoded[0] if len(encoded) == 1 else b"".join(encoded)
+
+    def diff(self, other):
+        # see BerTlvElement.diff(); roots are matched by tag name
+        return _diff(_diff_children("", self.tlv_elements, other.tlv_elements))
 
     def get_as_list(self, tlv_element=None):
         root_tag = self.__wrap_with_dummy_tag()
@@ -504,11 +1916,301 @@ class BerTlv():
             return ""
         return root_tag.get_as_hex_str()
 
-    def get_as_xml_str(self):
-        pass
+    def write_json(self, fp, indent=None):
+        write_tree(self, BerTlvJsonWriter(fp, indent))
 
-    def get_as_json(self):
-        pass
+    def write_xml(self, fp, indent=None):
+        write_tree(self, BerTlvXmlWriter(fp, indent))
+
+    def get_as_xml_str(self, indent=None):
+        out = io.StringIO()
+        self.write_xml(out, indent)
+        return out.getvalue()
+
+    def get_as_json(self, indent=None):
+        out = io.StringIO()
+        self.write_json(out, indent)
+        return out.getvalue()
+
+
+class BerTlvScan():
+    # Offsets table from BerTlvParser.scan(): one row per element in document (pre-order) order,
+    # held in typed arrays. parent is the row of the enclosing element, -1 at the top level;
+    # length is the content length (for indefinite lengths: without the end-of-contents).
+    def __init__(self, data):
+        self.data = data
+        self.depth = array("I")
+        self.tag = array("Q")
+        self.header_offset = array("Q")
+        self.value_offset = array("Q")
+        self.length = array("Q")
+        self.parent = array("q")
+
+    def __len__(self):
+        return len(self.tag)
+
+    def __getitem__(self, row):
+        return ScanEntry(self.depth[row], self.tag[row], self.header_offset[row], self.value_offset[row],
+                         self.length[row], self.parent[row])
+
+    def value(self, row):
+        start = self.value_offset[row]
+        return self.data[start:start + self.length[row]]
+
+    def __subtree_end(self, row):
+        # first row after row's subtree: header offsets grow in pre-order, so bisect on the value end
+        return bisect_left(self.header_offset, self.value_offset[row] + self.length[row], row + 1)
+
+    def children(self, row):
+        # rows directly inside row (-1: top-level rows), hopping from sibling to sibling
+        end = self.__subtree_end(row) if row >= 0 else len(self.tag)
+        rows = []
+        child = row + 1
+        while child < end:
+            rows.append(child)
+            child = self.__subtree_end(child)
+        return rows
+
+    def find(self, path):
+        # Row of the first element at path ("6F/A5/50", or "FF/6F/A5/50" as elsewhere), or None.
+        # Only the rows of the matching subtrees are visited; sibling subtrees are stepped over.
+        segments = path.upper().split(PATH_SEPARATOR)
+        if len(segments) > 1 and segments[0] == "FF":
+            segments = segments[1:]
+        try:
+            tags = [int.from_bytes(bytes.fromhex(segment), "big") for segment in segments if segment]
+        except ValueError:
+            tags = None
+        if tags is None or len(tags) != len(segments):
+            raise ValueError(f"Path {path!r} must be tag names in hex separated by {PATH_SEPARATOR!r}")
+        row = -1
+        for wanted in tags:
+            for child in self.children(row):
+                if self.tag[child] == wanted:
+                    row = child
+                    break
+            else:
+                return None
+        return row
+
+
+class BerTlvPathSet():
+    # A set of paths compiled into a lazily built DFA over tag names.
+    # Segments are tag names, "*" (exactly one tag) or "**" (any number of tags, including none).
+    # Paths start at the top level, as in BerTlv.find(): "9F02" is a top-level 9F02 only, "**/9F02"
+    # is a 9F02 at any depth. Every consumer (extractor, projection parse, parse_many(paths=...),
+    # column export) reads paths this way. A leading "FF/" is accepted as the dummy root wrapper.
+    class _State():
+        __slots__ = ("items", "accepts", "alive", "next")
+
+        def __init__(self, items, accepts, alive):
+            self.items = items
+            self.accepts = accepts
+            self.alive = alive
+            self.next = {}
+
+    def __init__(self, paths):
+        self.paths = list(paths)
+        self.__patterns = []
+        for path in self.paths:
+            segs = [seg for seg in path.upper().split(PATH_SEPARATOR) if seg]
+            if len(segs) > 1 and segs[0] == "FF":
+                segs = segs[1:]
+            if not segs:
+                raise ValueError(f"Empty path: {path!r}")
+            self.__patterns.append(tuple(segs))
+        self.__states = {}
+        self.start = self.__state(self.__closure((i, 0) for i in range(len(self.__patterns))))
+
+    def __closure(self, items):
+        items, stack = set(), list(items)
+        while stack:
+            i, pos = stack.pop()
+            if (i, pos) in items:
+                continue
+            items.add((i, pos))
+            pattern = self.__patterns[i]
+            if pos < len(pattern) and pattern[pos] == "**":
+                stack.append((i, pos + 1))
+        return frozenset(items)
+
+    def __state(self, items):
+        state = self.__states.get(items)
+        if state is None:
+            accepts = tuple(sorted(i for i, pos in items if pos == len(self.__patterns[i])))
+            alive = any(pos < len(self.__patterns[i]) for i, pos in items)
+            state = self.__states[items] = BerTlvPathSet._State(items, accepts, alive)
+        return state
+
+    def step_tag(self, state, tag, tag_length):
+        # same as step(), keyed by the tag as an int so the hot path skips hex formatting
+        nxt = state.next.get(tag)
+        if nxt is None:
+            nxt = state.next[tag] = self.step(state, tag.to_bytes(tag_length, "big").hex().upper())
+        return nxt
+
+    def step(self, state, tag_name):
+        nxt = state.next.get(tag_name)
+        if nxt is None:
+            moved = []
+            for i, pos in state.items:
+                pattern = self.__patterns[i]
+                if pos == len(pattern):
+                    continue
+                seg = pattern[pos]
+                if seg == "**":
+                    moved.append((i, pos))
+                elif seg == "*" or seg == tag_name:
+                    moved.append((i, pos + 1))
+            nxt = state.next[tag_name] = self.__state(self.__closure(moved))
+        return nxt
+
+
+class BerTlvExtractor():
+    # Pulls a fixed set of paths out of many messages in one pre-order walk per message.
+    # Subtrees no path can lead into are never visited; for raw bytes input they are skipped
+    # at the byte level by a projection parse and never decoded at all.
+    def __init__(self, paths, parser=None):
+        # parser: projection-parses raw bytes input (default: a lazy BerTlvParser)
+        self.path_set = paths if isinstance(paths, BerTlvPathSet) else BerTlvPathSet(paths)
+        self.paths = self.path_set.paths
+        self.parser = parser if parser is not None else BerTlvParser(lazy=True)
+
+    def __roots(self, tlv):
+        if isinstance(tlv, BerTlv):
+            return tlv.tlv_elements.items()
+        if isinstance(tlv, BerTlvElement):
+            return [(tlv.get_tag().hex().upper(), tlv)]
+        parsed = self.parser.parse_tlv_projection(tlv, self.path_set)
+        return parsed.tlv_elements.items() if parsed is not None else []
+
+    def __walk(self, tlv, first_only):
+        found = [None] * len(self.paths) if first_only else [[] for _ in self.paths]
+        missing = len(self.paths)
+        path_set = self.path_set
+        stack = [(tag_name, element, path_set.start) for tag_name, element in reversed(list(self.__roots(tlv)))]
+        while stack:
+            tag_name, element, state = stack.pop()
+            state = path_set.step(state, tag_name)
+            for i in state.accepts:
+                if not first_only:
+                    found[i].append(element)
+                elif found[i] is None:
+                    found[i] = element
+                    missing -= 1
+            if first_only and not missing:
+                break
+            if state.alive:
+                children = list(element.iter_children())
+                for child_tag, child in reversed(children):
+                    stack.append((child_tag, child, state))
+        return found
+
+    def extract(self, tlv):
+        # {path: first matching element or None}; tlv may be a BerTlv, a BerTlvElement or raw bytes
+        return dict(zip(self.paths, self.__walk(tlv, True)))
+
+    def extract_tuple(self, tlv):
+        return tuple(self.__walk(tlv, True))
+
+    def extract_all(self, tlv):
+        # {path: [every matching element in document order]}
+        return dict(zip(self.paths, self.__walk(tlv, False)))
+
+    def extract_decoded(self, messages, kinds="bcd", missing=0):
+        # {path: array of the first match per message}, decoded column-wise by decode_batch().
+        # kinds: "int" / "bcd" for every path, or {path: kind}; absent values become `missing`.
+        columns = [[] for _ in self.paths]
+        for message in messages:
+            for column, tlv_element in zip(columns, self.__walk(message, True)):
+                column.append(tlv_element.get_value_view() if tlv_element is not None else None)
+        if isinstance(kinds, str):
+            kinds = dict.fromkeys(self.paths, kinds)
+        return {path: decode_batch(column, kinds[path], missing) for path, column in zip(self.paths, columns)}
+
+
+def _diff_children(path, old_children, new_children):
+    # comparisons (path, old, new) for two children mappings; old or new is None if missing on that side
+    prefix = path + PATH_SEPARATOR if path else ""
+    pairs = [(prefix + tag_name, child, new_children.get(tag_name)) for tag_name, child in old_children.items()]
+    pairs.extend((prefix + tag_name, None, child) for tag_name, child in new_children.items()
+                 if tag_name not in old_children)
+    return pairs
+
+
+def _diff(pairs):
+    found = []
+    stack = list(reversed(pairs))
+    while stack:
+        path, old, new = stack.pop()
+        if old is None or new is None:
+            found.append(DiffEntry(path, old, new))
+            continue
+        if old.get_digest() == new.get_digest():
+            continue
+        old_children, new_children = dict(old.iter_children()), dict(new.iter_children())
+        if old.get_tag() != new.get_tag() or not old_children or not new_children or \
+                (old_children.keys() == new_children.keys() and list(old_children) != list(new_children)):
+            # leaf value change, leaf <-> constructed, or the same children reordered
+            found.append(DiffEntry(path, old, new))
+            continue
+        pairs = _diff_children(path, old_children, new_children)
+        if all(old_child is not None and new_child is not None and old_child.get_digest() == new_child.get_digest()
+               for _, old_child, new_child in pairs):
+            # same children: the difference is in this element's own length form
+            found.append(DiffEntry(path, old, new))
+            continue
+        stack.extend(reversed(pairs))
+    return found
+
+
+def _rebuild_element(records):
+    # unpickling counterpart of BerTlvElement.__reduce__
+    elements = []
+    for parent_index, tag_name, state in records:
+        tlv_element = BerTlvElement.__new__(BerTlvElement)
+        tlv_element.__setstate__(state)
+        if parent_index >= 0:
+            elements[parent_index].replace_child(tag_name, tlv_element)
+        elements.append(tlv_element)
+    return elements[0]
+
+
+def _leaf_values(tlv):
+    values = {}
+    stack = list(reversed(list(tlv.tlv_elements.items())))
+    while stack:
+        path, tlv_element = stack.pop()
+        children = list(tlv_element.iter_children())
+        if children:
+            stack.extend((path + PATH_SEPARATOR + tag_name, child) for tag_name, child in reversed(children))
+        else:
+            values[path] = tlv_element.get_value()
+    return values
+
+
+def _parse_chunk(task):
+    # process pool worker for BerTlvParser.parse_many: (results, stats or None)
+    mode, paths, (lazy, limits, timing), chunk = task
+    stats = BerTlvStats(timing) if timing is not None else None
+    return _parse_messages(BerTlvParser(lazy=lazy, limits=limits, stats=stats), mode, paths, chunk), stats
+
+
+def _parse_messages(parser, mode, paths, chunk):
+    extractor = BerTlvExtractor(paths, parser) if mode == "paths" else None
+    results = []
+    for message in chunk:
+        data = binascii.unhexlify(message) if isinstance(message, str) else message
+        if mode == "paths":
+            found = extractor.extract(data)
+            results.append({path: (e.get_value() if e is not None else None) for path, e in found.items()})
+            continue
+        tlv = parser.parse_tlv_bytes(data)
+        if mode == "compact":
+            results.append(_leaf_values(tlv) if tlv is not None else {})
+        else:
+            results.append(tlv)
+    return results
 
 
 if __name__ == "__main__":
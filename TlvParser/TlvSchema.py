@@ -0,0 +1,151 @@
+from collections import namedtuple, OrderedDict
+
+from TlvParser.TlvParser import BerTlvParser, _TAG_IS_LONG_FORM, _TAG_HAS_MORE
+from TlvParser.TlvValues import decode_int, decode_bcd, decode_cn, decode_date, decode_str
+
+
+TagSpec = namedtuple('TagSpec', ['tag', 'name', 'kind', 'constructed', 'length', 'max_length'])
+
+# value type -> converter applied to the value bytes
+CONVERTERS = {
+    "bytes": bytes,
+    "int": decode_int,
+    "bcd": decode_bcd,
+    "cn": decode_cn,
+    "date": decode_date,
+    "str": decode_str,
+    "hex": lambda value: bytes(value).hex().upper(),
+}
+
+
+class BerTlvSchema():
+    # A tag dictionary: which tags a message format carries, their names, value types and lengths.
+    #   schema = BerTlvSchema(name="GenerateAc")
+    #   schema.register("77", constructed=True)
+    #   schema.register("9F02", "amount", "bcd", length=6)
+    #   schema.register("9F36", "atc", "int", length=2)
+    #   decoder = schema.compile()
+    # Registered constructed tags are containers: they are descended into, at any depth, and the
+    # tags inside them are matched too. An element whose tag is not registered goes whole into
+    # record.unknown, so registered tags inside an unregistered container are not matched.
+    def __init__(self, tags=None, name="BerTlvRecord"):
+        self.name = name
+        self.tags = OrderedDict()   # tag as int -> TagSpec
+        for tag, spec in (tags or {}).items():
+            self.register(tag, **spec)
+
+    def register(self, tag, name=None, kind="bytes", constructed=None, length=None, max_length=None):
+        if isinstance(tag, str):
+            tag_bytes = bytes.fromhex(tag)
+        elif isinstance(tag, int):
+            tag_bytes = tag.to_bytes(max(1, (tag.bit_length() + 7) // 8), "big")
+        else:
+            tag_bytes = bytes(tag)
+        if constructed is None:
+            constructed = bool(tag_bytes[0] & 0x20)
+        if not constructed:
+            if name is None:
+                raise ValueError(f"Primitive tag {tag_bytes.hex().upper()} needs a field name")
+            if kind not in CONVERTERS:
+                raise ValueError(f"Unknown value type {kind!r}, expected one of {tuple(CONVERTERS)}")
+        spec = TagSpec(int.from_bytes(tag_bytes, "big"), name, kind, constructed, length, max_length)
+        self.tags[spec.tag] = spec
+        return spec
+
+    def compile(self, parser=None):
+        return BerTlvDecoder(self, parser)
+
+
+class BerTlvDecoder():
+    # Decoder specialized for one BerTlvSchema. Known primitive tags go straight into a slot of a
+    # namedtuple record with their converter applied; nothing else is materialized. Elements with
+    # tags outside the schema fall back to the generic parser and are collected in record.unknown.
+    def __init__(self, schema, parser=None):
+        self.schema = schema
+        self.parser = parser if parser is not None else BerTlvParser()
+        fields = [spec.name for spec in schema.tags.values() if not spec.constructed]
+        self.record_type = namedtuple(schema.name, fields + ["unknown"])
+        self.__width = len(fields)
+        # tag int -> None for containers, else (slot, converter, fixed length, max length)
+        self.__dispatch = {}
+        for spec in schema.tags.values():
+            if spec.constructed:
+                self.__dispatch[spec.tag] = None
+            else:
+                self.__dispatch[spec.tag] = (fields.index(spec.name), CONVERTERS[spec.kind],
+                                             spec.length, spec.max_length)
+
+    def decode(self, data):
+        b = data if isinstance(data, (bytes, bytearray)) else memoryview(data).cast("B")
+        values = [None] * (self.__width + 1)
+        unknown = values[-1] = []
+        dispatch = self.__dispatch
+        stack = []
+        i, end = 0, len(b)
+        while True:
+            if i >= end:
+                if not stack:
+                    break
+                i, end = stack.pop()
+                continue
+
+            start = i
+            tag = b[i]; i += 1
+            if _TAG_IS_LONG_FORM[tag]:
+                while True:
+                    if i >= end:
+                        raise ValueError(f"Truncated tag at offset {start}")
+                    nxt = b[i]; i += 1
+                    tag = (tag << 8) | nxt
+                    if not _TAG_HAS_MORE[nxt]:
+                        break
+            if i >= end:
+                raise ValueError(f"Missing length at offset {i}")
+            length = b[i]; i += 1
+            if length & 0x80:
+                if length == 0x80:
+                    if not b[start] & 0x20:
+                        raise ValueError(f"Indefinite length on primitive tag at offset {start}")
+                    # indefinite length: let the generic parser find the end-of-contents
+                    try:
+                        next_offset = self.parser.skip_element(b, start, end)
+                    except IndexError as e:
+                        raise ValueError(f"Malformed indefinite-length element {tag:X} at offset {start}: {e}") from e
+                    length = next_offset - 2 - i
+                else:
+                    n = length & 0x7F
+                    length = int.from_bytes(b[i:i + n], "big")
+                    i += n
+                    next_offset = i + length
+            else:
+                next_offset = i + length
+            value_end = i + length
+            if next_offset > end:
+                raise ValueError(f"Element {tag:X} at offset {start} overruns its container ending at {end}")
+
+            if tag not in dispatch:
+                try:
+                    parsed = self.parser.parse_tlv_bytes(b[start:next_offset])
+                except (IndexError, LookupError) as e:
+                    # the generic parser's truncation / duplicate-tag errors, as ValueError like the rest
+                    raise ValueError(f"Malformed element {tag:X} at offset {start}: {e}") from e
+                unknown.extend(parsed.tlv_elements.values())
+            else:
+                entry = dispatch[tag]
+                if entry is None:
+                    # container: descend now, resume the siblings afterwards
+                    stack.append((next_offset, end))
+                    end = value_end
+                    continue
+                slot, convert, fixed_length, max_length = entry
+                if fixed_length is not None and length != fixed_length:
+                    raise ValueError(f"Tag {tag:X} at offset {start}: length {length}, expected {fixed_length}")
+                if max_length is not None and length > max_length:
+                    raise ValueError(f"Tag {tag:X} at offset {start}: length {length} exceeds {max_length}")
+                values[slot] = convert(b[i:value_end])
+            i = next_offset
+        return self.record_type._make(values)
+
+    def decode_many(self, messages):
+        decode = self.decode
+        return [decode(message) for message in messages]
@@ -0,0 +1,102 @@
+from time import perf_counter
+
+
+class BerTlvStats():
+    # Counters and optional per-phase timings for BerTlvParser and BerTlv.find().
+    # Nothing is collected unless an instance is handed to BerTlvParser(stats=...) or
+    # BerTlv.set_stats(); without one the parser runs its plain, uninstrumented loop.
+    #
+    # Phases (seconds, only with timing=True):
+    #   header - tag and length decoding
+    #   value  - value span / end-of-contents scan and element creation
+    #   attach - add_child() incl. the duplicate tag check
+    #   parse  - whole parse_tlv_bytes() calls (includes the above and the recursion between them)
+    #   find   - whole BerTlv.find() calls
+    PHASES = ("header", "value", "attach", "parse", "find")
+    EVENTS = ("message", "element", "lookup")
+
+    def __init__(self, timing=False):
+        self.timing = timing
+        self.clock = perf_counter
+        self.__hooks = {event: [] for event in BerTlvStats.EVENTS}
+        self.reset()
+
+    def reset(self):
+        self.messages = 0
+        self.bytes = 0
+        self.elements = 0
+        self.constructed = 0
+        self.max_depth = 0
+        self.lookups = 0
+        self.lookup_misses = 0
+        self.phase_seconds = dict.fromkeys(BerTlvStats.PHASES, 0.0)
+
+    def add_hook(self, event, callback):
+        # "message": callback(tlv, size in bytes)
+        # "element": callback(tlv_element, depth)   depth 0 = top level
+        # "lookup":  callback(path, result)
+        if event not in self.__hooks:
+            raise ValueError(f"Unknown event {event!r}, expected one of {BerTlvStats.EVENTS}")
+        self.__hooks[event].append(callback)
+
+    def remove_hook(self, event, callback):
+        self.__hooks[event].remove(callback)
+
+    def message_parsed(self, tlv, size, seconds=0.0):
+        self.messages += 1
+        self.bytes += size
+        self.phase_seconds["parse"] += seconds
+        for callback in self.__hooks["message"]:
+            callback(tlv, size)
+
+    def element_parsed(self, tlv_element, depth):
+        self.elements += 1
+        if tlv_element.is_constructed:
+            self.constructed += 1
+        if depth > self.max_depth:
+            self.max_depth = depth
+        for callback in self.__hooks["element"]:
+            callback(tlv_element, depth)
+
+    def lookup_done(self, path, result, seconds=0.0):
+        self.lookups += 1
+        if result is None:
+            self.lookup_misses += 1
+        self.phase_seconds["find"] += seconds
+        for callback in self.__hooks["lookup"]:
+            callback(path, result)
+
+    def merge(self, other):
+        # add the counters of another instance, e.g. one filled in a parse_many() worker process;
+        # its hooks are not replayed
+        self.messages += other.messages
+        self.bytes += other.bytes
+        self.elements += other.elements
+        self.constructed += other.constructed
+        self.max_depth = max(self.max_depth, other.max_depth)
+        self.lookups += other.lookups
+        self.lookup_misses += other.lookup_misses
+        for phase, seconds in other.phase_seconds.items():
+            self.phase_seconds[phase] += seconds
+
+    def add_phase(self, phase, seconds):
+        self.phase_seconds[phase] += seconds
+
+    def as_dict(self):
+        # flat name -> number mapping, ready for a metrics exporter
+        counters = {
+            "tlv_messages_total": self.messages,
+            "tlv_bytes_total": self.bytes,
+            "tlv_elements_total": self.elements,
+            "tlv_constructed_elements_total": self.constructed,
+            "tlv_max_depth": self.max_depth,
+            "tlv_lookups_total": self.lookups,
+            "tlv_lookup_misses_total": self.lookup_misses,
+        }
+        if self.timing:
+            for phase, seconds in self.phase_seconds.items():
+                counters[f"tlv_{phase}_seconds_total"] = seconds
+        return counters
+
+    def __str__(self):
+        return "\n".join(f"{name}: {value}" for name, value in self.as_dict().items())
@@ -0,0 +1,105 @@
+import asyncio
+from collections import deque
+from contextlib import contextmanager
+
+from TlvParser.TlvParser import BerTlvElement, BerTlvParser
+
+
+class BerTlvStreamReader():
+    def __init__(self, reader: asyncio.StreamReader, parser=None, chunk_size=65536):
+        self.reader = reader
+        self.parser = parser if parser is not None else BerTlvParser()
+        self.chunk_size = chunk_size
+        self.__ready = deque()
+
+    async def read_element(self):
+        # Returns the next complete top-level BerTlvElement, or None on a clean EOF.
+        while not self.__ready:
+            chunk = await self.reader.read(self.chunk_size)
+            if not chunk:
+                # elements completed before a malformed one are held by the parser after feed() raised
+                self.__ready.extend(self.parser.feed(b""))
+                if self.__ready:
+                    break
+                self.parser.close()
+                return None
+            self.__ready.extend(self.parser.feed(chunk))
+        return self.__ready.popleft()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        tlv_element = await self.read_element()
+        if tlv_element is None:
+            raise StopAsyncIteration
+        return tlv_element
+
+
+class BerTlvStreamWriter():
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+
+    def write_nowait(self, tlv):
+        # tlv: BerTlvElement, BerTlv or already encoded bytes
+        self.writer.write(tlv if isinstance(tlv, (bytes, bytearray, memoryview)) else tlv.encode())
+
+    async def write(self, tlv):
+        self.write_nowait(tlv)
+        await self.writer.drain()
+
+    async def write_many(self, tlvs):
+        # one drain for the whole batch
+        for tlv in tlvs:
+            self.write_nowait(tlv)
+        await self.writer.drain()
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+class BerTlvStreamEncoder():
+    # Writes constructed elements with indefinite length (tag 0x80 ... 00 00) to any object with a
+    # write(bytes) method, so children can be emitted one at a time without knowing or buffering
+    # the total length first. Nesting is allowed; only the open tags are kept in memory.
+    def __init__(self, fp):
+        self.fp = fp
+        self.__open_tags = []
+
+    def begin(self, tag):
+        tlv_element = tag if isinstance(tag, BerTlvElement) else BerTlvElement(tag)
+        if not tlv_element.is_constructed:
+            raise ValueError(f"Indefinite length needs a constructed tag: {tlv_element.get_tag().hex().upper()}")
+        self.fp.write(tlv_element.get_tag() + b"\x80")
+        self.__open_tags.append(tlv_element.get_tag())
+
+    def write(self, tlv):
+        # tlv: BerTlvElement, BerTlv or already encoded bytes
+        if not self.__open_tags:
+            raise ValueError("write() outside of begin()/end()")
+        self.fp.write(tlv if isinstance(tlv, (bytes, bytearray, memoryview)) else tlv.encode())
+
+    def end(self):
+        if not self.__open_tags:
+            raise ValueError("end() without begin()")
+        self.__open_tags.pop()
+        self.fp.write(b"\x00\x00")
+
+    @contextmanager
+    def constructed(self, tag):
+        self.begin(tag)
+        yield self
+        self.end()
+
+    def depth(self):
+        return len(self.__open_tags)
+
+    def close(self):
+        if self.__open_tags:
+            raise ValueError(f"{len(self.__open_tags)} constructed element(s) still open")
+
+
+async def open_tlv_connection(host=None, port=None, parser=None, **kwargs):
+    reader, writer = await asyncio.open_connection(host, port, **kwargs)
+    return BerTlvStreamReader(reader, parser), BerTlvStreamWriter(writer)
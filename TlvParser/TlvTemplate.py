@@ -0,0 +1,79 @@
+import copy
+from collections import OrderedDict
+
+from TlvParser.TlvParser import BerTlv, BerTlvElement, PATH_SEPARATOR, _length_octets
+
+
+class BerTlvTemplate():
+    # A frozen message (FCI, GENERATE AC response, ...) to stamp out per-message instances from.
+    #   template = BerTlvTemplate(parser.parse_tlv(fci_hex))
+    #   message = template.instantiate({"6F/A5/50": b"VISA", "6F/84": aid}).encode()
+    # The template is copied, encoded once and frozen. An instance copies only the elements on the
+    # paths to the overridden fields; every other subtree is shared with the template, cached
+    # encoding included, so instantiate() + encode() cost grows with the number of changed fields,
+    # not with the template size. Shared elements stay frozen (editing them raises TypeError)
+    # and their get_parent() is the template element.
+    def __init__(self, tlv):
+        self.is_multi_root = isinstance(tlv, BerTlv)
+        source = copy.deepcopy(tlv)
+        if self.is_multi_root:
+            self.roots = OrderedDict(source.tlv_elements)
+        else:
+            self.roots = OrderedDict([(source.get_tag().hex().upper(), source)])
+        for root in self.roots.values():
+            root.freeze()
+
+    def instantiate(self, overrides=None):
+        # overrides: {path: new value bytes (primitive elements only), or a BerTlvElement replacing the
+        # element at path}.
+        # Returns a BerTlv if the template was built from one, else a BerTlvElement.
+        roots = OrderedDict(self.roots)
+        copies = {}   # path -> the editable copy made for it in this instance
+        normalized = []
+        for path, value in (overrides or {}).items():
+            segments = path.upper().split(PATH_SEPARATOR)
+            if segments[0] == "FF" and len(segments) > 1 and "FF" not in roots:
+                segments = segments[1:]
+            normalized.append((path, segments, value))
+        # an element override replaces the whole subtree, so nothing below it can be overridden too
+        replaced = {tuple(segments): path for path, segments, value in normalized if isinstance(value, BerTlvElement)}
+        for path, segments, value in normalized:
+            for depth in range(1, len(segments)):
+                if tuple(segments[:depth]) in replaced:
+                    raise ValueError(f"{path} is inside {replaced[tuple(segments[:depth])]}, which is replaced "
+                                     f"by an element; override the element itself instead")
+
+        for path, segments, value in normalized:
+            parent, prefix = None, None
+            for depth, segment in enumerate(segments):
+                prefix = segment if prefix is None else prefix + PATH_SEPARATOR + segment
+                siblings = roots if parent is None else parent.get_children()
+                if segment not in siblings:
+                    raise LookupError(f"{path} is not in the template")
+                if depth == len(segments) - 1 and not isinstance(value, BerTlvElement) \
+                        and siblings[segment].is_constructed:
+                    # its value is its children, so the bytes would be dropped on encode()
+                    raise ValueError(f"{path} is a constructed element; override it with a BerTlvElement")
+                if depth == len(segments) - 1 and isinstance(value, BerTlvElement):
+                    tlv_element = value
+                else:
+                    tlv_element = copies.get(prefix)
+                    if tlv_element is None:
+                        tlv_element = copies[prefix] = siblings[segment].shallow_copy()
+                if parent is None:
+                    roots[segment] = tlv_element
+                elif siblings[segment] is not tlv_element:
+                    parent.replace_child(segment, tlv_element)
+                parent = tlv_element
+            if not isinstance(value, BerTlvElement):
+                # length fields as a parse of the encoding would set them (long form past 127 octets)
+                length_bytes = _length_octets(len(value))
+                parent.set_value_bytes(value)
+                parent.set_length_bytes(length_bytes)
+                parent.set_length_of_length(len(length_bytes) if len(value) > 127 else 0)
+        if self.is_multi_root:
+            return BerTlv(roots)
+        return next(iter(roots.values()))
+
+    def encode(self, overrides=None):
+        return self.instantiate(overrides).encode()
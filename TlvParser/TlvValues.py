@@ -0,0 +1,115 @@
+from array import array
+from datetime import date
+
+try:
+    import numpy as np
+except ImportError:  # batch decoding falls back to array.array
+    np = None
+
+
+# packed BCD octet -> 0..99, or -1 if either nibble is not a decimal digit
+_BCD_OCTET = tuple((b >> 4) * 10 + (b & 0x0F) if (b >> 4) < 10 and (b & 0x0F) < 10 else -1 for b in range(256))
+
+# widest values that still fit the batch result types
+_MAX_INT_WIDTH = 8   # uint64
+_MAX_BCD_WIDTH = 9   # 18 digits in int64
+_MAX_SIGNED_INT_WIDTH = 7   # int64
+
+
+def decode_int(value, signed=False):
+    # binary, big-endian (EMV format "b"), e.g. 9F36 ATC
+    return int.from_bytes(value, byteorder="big", signed=signed)
+
+
+def decode_bcd(value):
+    # packed BCD (EMV format "n"), e.g. 9F02 amount "000000001500" -> 1500, 5F2A "0978" -> 978
+    result = 0
+    for octet in value:
+        digits = _BCD_OCTET[octet]
+        if digits < 0:
+            raise ValueError(f"Invalid BCD octet {octet:02X} in {bytes(value).hex().upper()}")
+        result = result * 100 + digits
+    return result
+
+
+def decode_cn(value):
+    # compressed numeric (EMV format "cn"): digits left aligned, padded with trailing F nibbles.
+    # Returned as str so leading zeros (PANs) survive.
+    digits = bytes(value).hex().upper().rstrip("F")
+    if not digits.isdigit() and digits:
+        raise ValueError(f"Invalid compressed numeric value {bytes(value).hex().upper()}")
+    return digits
+
+
+def decode_date(value):
+    # YYMMDD in BCD, e.g. 9A transaction date, 5F24 expiry; YY < 50 is 20YY, otherwise 19YY
+    if len(value) != 3:
+        raise ValueError(f"Date must be 3 bytes, got {len(value)}")
+    yy, mm, dd = (_BCD_OCTET[octet] for octet in value)
+    if min(yy, mm, dd) < 0:
+        raise ValueError(f"Invalid BCD date {bytes(value).hex().upper()}")
+    return date(2000 + yy if yy < 50 else 1900 + yy, mm, dd)
+
+
+def decode_str(value, encoding="ascii"):
+    # alphanumeric (EMV formats "a", "an", "ans"), e.g. 50 application label
+    return bytes(value).decode(encoding)
+
+
+def decode_batch(values, kind="int", missing=0):
+    # Decode one field from many messages at once.
+    # values: iterable of bytes-like values, None where the field is absent (filled with `missing`)
+    # kind:   "int" (binary, up to 8 bytes, unsigned) or "bcd" (packed BCD, up to 18 digits)
+    # Returns a NumPy array (uint64 / int64) when NumPy is installed, else array.array ("Q" / "q").
+    # A negative `missing` makes "int" results int64 / "q", for values up to 7 bytes.
+    if kind not in ("int", "bcd"):
+        raise ValueError(f"Unsupported batch kind {kind!r}, expected 'int' or 'bcd'")
+    values = list(values)
+    widths = {len(v) for v in values if v is not None}
+    width = max(widths, default=0)
+    limit = _MAX_INT_WIDTH if kind == "int" else _MAX_BCD_WIDTH
+    if width > limit:
+        raise ValueError(f"{kind} values wider than {limit} bytes cannot be batch decoded")
+    signed = kind == "bcd" or missing < 0
+    if signed and width > _MAX_SIGNED_INT_WIDTH and kind == "int":
+        raise ValueError(f"Negative missing value {missing} needs int values of at most "
+                         f"{_MAX_SIGNED_INT_WIDTH} bytes, got {width}")
+    if not (-(1 << 63) if signed else 0) <= missing < (1 << 63 if signed else 1 << 64):
+        raise ValueError(f"Missing value {missing} does not fit the {'int64' if signed else 'uint64'} result")
+    if np is None:
+        decode = decode_int if kind == "int" else decode_bcd
+        return array("q" if signed else "Q", (missing if v is None else decode(v) for v in values))
+    return _decode_batch_numpy(values, kind, missing, width, widths, signed)
+
+
+def _decode_batch_numpy(values, kind, missing, width, widths, signed):
+    n = len(values)
+    present = [v is not None for v in values]
+    if all(present) and len(widths) <= 1:
+        packed = np.frombuffer(b"".join(values), dtype=np.uint8)
+    else:
+        # right-align every value into a zero padded row
+        rows = bytearray(n * width)
+        for i, v in enumerate(values):
+            if v:
+                end = (i + 1) * width
+                rows[end - len(v):end] = v
+        packed = np.frombuffer(bytes(rows), dtype=np.uint8)
+    matrix = packed.reshape(n, width) if width else np.zeros((n, 0), dtype=np.uint8)
+
+    if kind == "int":
+        weights = np.left_shift(np.uint64(1), np.arange(8 * (width - 1), -1, -8, dtype=np.uint64))
+        result = (matrix.astype(np.uint64) * weights).sum(axis=1, dtype=np.uint64)
+        if signed:
+            result = result.astype(np.int64)
+    else:
+        high, low = matrix >> 4, matrix & 0x0F
+        if (high > 9).any() or (low > 9).any():
+            row = int(np.nonzero(((high > 9) | (low > 9)).any(axis=1))[0][0])
+            raise ValueError(f"Invalid BCD value {bytes(matrix[row]).hex().upper()} at index {row}")
+        weights = 100 ** np.arange(width - 1, -1, -1, dtype=np.int64)
+        result = ((high.astype(np.int64) * 10 + low) * weights).sum(axis=1, dtype=np.int64)
+
+    if not all(present):
+        result[~np.array(present)] = missing
+    return result
@@ -1,4 +1,11 @@
-from TlvParser.TlvParser import BerTlvElement, BerTlvParser, BerTlv
+from TlvParser.TlvParser import BerTlvElement, BerTlvParser, BerTlv, BerTlvPathSet, BerTlvExtractor, BerTlvScan, \
+    TlvDecodeError, BerTlvLimits, UNTRUSTED_LIMITS
+from TlvParser.TlvColumns import BerTlvColumn, BerTlvColumnExporter
+from TlvParser.TlvFile import BerTlvFile
+from TlvParser.TlvSchema import BerTlvSchema, BerTlvDecoder
+from TlvParser.TlvStats import BerTlvStats
+from TlvParser.TlvTemplate import BerTlvTemplate
+from TlvParser.TlvStream import BerTlvStreamEncoder, BerTlvStreamReader, BerTlvStreamWriter, open_tlv_connection
 
 __all__ = ["TlvParser"]
 __version__ = "0.1.0"
\ No newline at end of file
@@ -0,0 +1,172 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import timeit
+import tracemalloc
+
+
+# run from anywhere without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from TlvParser.TlvParser import BerTlvElement, BerTlvParser
+
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# same sample as in test/TlvParser_test.py
+FCI = "6F398408A000000025010403A52D5010414D45524943414E20455850524553538701019F38069F35019F6E045F2D02656EBF0C079F0A0400010102"
+
+
+def emv_transaction():
+    # typical GENERATE AC response data, wrapped in a 77 template
+    tx = BerTlvElement(0x77)
+    for tag, value in ((0x9F02, "000000001500"), (0x9F03, "000000000000"), (0x9F1A, "0840"), (0x95, "0000008000"),
+                       (0x5F2A, "0840"), (0x9A, "261018"), (0x9C, "00"), (0x9F37, "1A2B3C4D"), (0x82, "1980"),
+                       (0x9F36, "0042"), (0x9F26, "8E4A1C2B3D4E5F60"), (0x9F27, "80"),
+                       (0x9F10, "06010A03A00000"), (0x9F33, "E0F8C8"), (0x9F34, "420300")):
+        tx.add_child(BerTlvElement(tag, bytes.fromhex(value)))
+    return tx.encode().hex().upper()
+
+
+def wide_message(siblings=300):
+    # one template with hundreds of distinct three-octet tags DF 8x yy
+    wide = BerTlvElement(0x70)
+    for n in range(siblings):
+        tag = 0xDF0000 | ((0x81 + n // 0x7F) << 8) | (1 + n % 0x7F)
+        wide.add_child(BerTlvElement(tag, n.to_bytes(4, "big")))
+    return wide.encode().hex().upper()
+
+
+def large_value(size=64 * 1024):
+    template = BerTlvElement(0x70)
+    template.add_child(BerTlvElement(0x5A, bytes.fromhex("4111111111111111")))
+    template.add_child(BerTlvElement(0xDF01, bytes(range(256)) * (size // 256)))
+    return template.encode().hex().upper()
+
+
+CORPORA = {
+    # name: (hex message, path used for find)
+    "emv_transaction": (emv_transaction(), "77/9F36"),
+    "fci_deep": (FCI, "6F/A5/BF0C/9F0A"),
+    "wide_flat": (wide_message(), "70/DF837F"),
+    "large_value": (large_value(), "70/DF01"),
+}
+
+
+def time_op(stmt, repeat=5):
+    # best of `repeat` runs, in microseconds per call
+    timer = timeit.Timer(stmt)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e6
+
+
+def calibration():
+    # Fixed pure-Python workload; timings are compared relative to it so a baseline
+    # recorded on a faster or slower box still gives a meaningful ratio.
+    def work():
+        total = 0
+        for i in range(2000):
+            total += len({i: str(i)})
+        return total
+    return time_op(work)
+
+
+def count_elements(tlv_element):
+    return 1 + sum(count_elements(child) for child in tlv_element.get_children().values())
+
+
+def bytes_per_element(message, copies=200):
+    parser = BerTlvParser()
+    data = bytes.fromhex(message)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [parser.parse_tlv_bytes(data) for _ in range(copies)]
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    elements = sum(count_elements(e) for e in kept[0].tlv_elements.values()) * copies
+    return used / elements
+
+
+def run():
+    results = {}
+    parser = BerTlvParser()
+    for name, (message, path) in CORPORA.items():
+        hex_message = message.encode()
+        tlv = parser.parse_tlv(hex_message)
+        results[name] = {
+            "parse_tlv_us": time_op(lambda: parser.parse_tlv(hex_message)),
+            "find_us": time_op(lambda: tlv.find(path)),
+            # encode a freshly parsed tree each time so the cached encoding does not hide the real cost
+            "parse_encode_us": time_op(lambda: parser.parse_tlv(hex_message).encode()),
+            "encode_cached_us": time_op(tlv.encode),
+            "get_as_dict_us": time_op(tlv.get_as_dict),
+            "bytes_per_element": bytes_per_element(message),
+        }
+    return results
+
+
+def compare(results, baseline, speed, time_threshold, memory_threshold):
+    # Returns a list of human readable regressions against the stored baseline.
+    # speed: current calibration time / baseline calibration time
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            reference = baseline.get(name, {}).get(metric)
+            if not reference:
+                continue
+            if metric == "bytes_per_element":
+                threshold = memory_threshold
+            else:
+                threshold = time_threshold
+                reference *= speed
+            if value > reference * threshold:
+                regressions.append(f"{name}.{metric}: {value:.2f} vs baseline {reference:.2f} "
+                                   f"(x{value / reference:.2f} > x{threshold})")
+    return regressions
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Benchmarks for the TLV hot paths")
+    arg_parser.add_argument("--save-baseline", action="store_true", help=f"store the results in {BASELINE}")
+    arg_parser.add_argument("--baseline", default=BASELINE, help="baseline file to compare against")
+    arg_parser.add_argument("--time-threshold", type=float, default=1.30,
+                            help="allowed slowdown factor for timings (default 1.30)")
+    arg_parser.add_argument("--memory-threshold", type=float, default=1.10,
+                            help="allowed growth factor for bytes per element (default 1.10)")
+    args = arg_parser.parse_args(argv)
+
+    calibration_us = calibration()
+    results = run()
+    print(f"calibration_us {calibration_us:.2f}")
+    for name, metrics in results.items():
+        print(name)
+        for metric, value in metrics.items():
+            print(f"    {metric:<20}{value:12.2f}")
+
+    if args.save_baseline:
+        with open(BASELINE, "w") as f:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(),
+                       "calibration_us": calibration_us, "results": results},
+                      f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"baseline saved to {BASELINE}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("no baseline to compare against, run with --save-baseline first")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    speed = calibration_us / baseline["calibration_us"]
+    regressions = compare(results, baseline["results"], speed, args.time_threshold, args.memory_threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
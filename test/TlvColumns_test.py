@@ -0,0 +1,52 @@
+import pytest
+
+from TlvParser.TlvColumns import BerTlvColumnExporter
+from TlvParser.TlvParser import BerTlvParser, TlvDecodeError, UNTRUSTED_LIMITS
+from test.helpers import transaction
+
+
+def labelled(n):
+    # odd transactions carry a label
+    return transaction(n, label=b"VISA" * n if n % 2 else None)
+
+
+class TestTlvColumns:
+
+    def test_columns_from_raw_and_parsed_messages(self):
+        messages = [labelled(n) for n in range(6)]
+        messages[3] = BerTlvParser().parse_tlv_bytes(messages[3])
+        exporter = BerTlvColumnExporter(["77/9F02", "**/50", "77/9F36"])
+        columns = exporter.export(messages)
+        assert len(exporter) == 6
+
+        amounts = columns["77/9F02"]
+        assert list(amounts.offsets) == [6 * n for n in range(7)]
+        assert bytes(amounts.data[6:12]) == bytes.fromhex("000000000001")
+        assert all(amounts.present)
+
+        labels = columns["**/50"]
+        assert list(labels.present) == [0, 1, 0, 1, 0, 1]
+        assert [labels[row] for row in range(6)] == [None, b"VISA", None, b"VISA" * 3, None, b"VISA" * 5]
+        assert labels.offsets[-1] == len(labels.data) == 36
+        assert not any(columns["77/9F36"].present)
+
+    def test_deep_raw_messages(self):
+        deep = bytes.fromhex("5001AA")
+        for _ in range(3000):
+            deep = bytes([0xE1, 0x82]) + len(deep).to_bytes(2, "big") + deep
+        columns = BerTlvColumnExporter(["**/50"]).export([deep, labelled(1)])
+        assert [columns["**/50"][row] for row in range(2)] == [b"\xAA", b"VISA"]
+        with pytest.raises(TlvDecodeError):
+            BerTlvColumnExporter(["**/50"], BerTlvParser(limits=UNTRUSTED_LIMITS)).export([deep])
+
+    def test_numpy_and_arrow_views(self):
+        np = pytest.importorskip("numpy")
+        columns = BerTlvColumnExporter(["**/50"]).export(labelled(n) for n in range(4))
+        data, offsets, present = columns["**/50"].to_numpy()
+        assert data.dtype == np.uint8 and offsets.dtype == np.int64
+        assert present.tolist() == [False, True, False, True]
+
+        pa = pytest.importorskip("pyarrow")
+        arrow = columns["**/50"].to_arrow()
+        assert arrow.type == pa.large_binary()
+        assert arrow.to_pylist() == [None, b"VISA", None, b"VISA" * 3]
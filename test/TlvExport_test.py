@@ -0,0 +1,48 @@
+import io
+import json
+import xml.etree.ElementTree as ET
+
+from TlvParser.TlvParser import BerTlvElement, BerTlvParser
+
+
+FCI = bytes.fromhex("6F398408A000000025010403A52D5010414D45524943414E20455850524553538701019F38069F35019F6E045F2D02656EBF0C079F0A0400010102")
+
+
+class TestTlvExport:
+
+    def test_json_matches_dict_export(self):
+        parser = BerTlvParser()
+        tlv = parser.parse_tlv_bytes(FCI)
+        exported = json.loads(tlv.get_as_json(indent=2))
+        assert exported["6F"]["A5"]["BF0C"] == {"9F0A": "00010102"}
+        assert exported["6F"]["84"] == tlv.find("6F/84").get_value_as_hex_str().upper()
+
+        streamed = io.StringIO()
+        parser.write_json(FCI, streamed)
+        assert streamed.getvalue() == tlv.get_as_json()
+
+    def test_xml_from_tree_and_raw_buffer(self):
+        parser = BerTlvParser(lazy=True)
+        tlv = parser.parse_tlv_bytes(FCI)
+        streamed = io.StringIO()
+        parser.write_xml(memoryview(FCI), streamed, indent=2)
+        assert streamed.getvalue() == tlv.get_as_xml_str(indent=2)
+
+        root = ET.fromstring(tlv.get_as_xml_str().encode())
+        assert root.tag == "tlv"
+        bf0c = root.find("element[@tag='6F']/element[@tag='A5']/element[@tag='BF0C']")
+        assert bf0c.find("element").attrib["tag"] == "9F0A" and bf0c.find("element").text == "00010102"
+
+    def test_element_and_multi_root_exports(self):
+        template = BerTlvElement(0x70)
+        template.add_child(BerTlvElement(0x5A, bytes.fromhex("4111111111111111")))
+        assert template.get_as_json() == '{"70":{"5A":"4111111111111111"}}'
+        assert BerTlvElement(0xA5).get_as_xml_str() == \
+            '<?xml version="1.0" encoding="UTF-8"?><tlv><element tag="A5"></element></tlv>'
+
+        raw = bytes.fromhex("9F020600000000010070808701010000")
+        tlv = BerTlvParser().parse_tlv_bytes(raw)
+        assert json.loads(tlv.get_as_json()) == {"9F02": "000000000100", "70": {"87": "01"}}
+        streamed = io.StringIO()
+        BerTlvParser().write_json(raw, streamed)
+        assert streamed.getvalue() == tlv.get_as_json()
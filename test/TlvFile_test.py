@@ -0,0 +1,63 @@
+import pytest
+
+from TlvParser.TlvParser import BerTlvElement
+from TlvParser.TlvFile import BerTlvFile
+
+
+def make_records(n):
+    records = []
+    for i in range(n):
+        template = BerTlvElement(0x70, {})
+        template.add_child(BerTlvElement(0x9F36, i.to_bytes(2, "big")))
+        template.add_child(BerTlvElement(0x9F02, i.to_bytes(6, "big")))
+        if i % 3 == 0:
+            template.add_child(BerTlvElement(0xDF01, bytes(300)))   # long-form length
+        records.append(template.encode())
+    return records
+
+
+class TestTlvFile:
+
+    def test_iterate_and_seek(self, tmp_path):
+        records = make_records(50)
+        path = tmp_path / "dump.ber"
+        path.write_bytes(b"".join(records))
+
+        with BerTlvFile(str(path), checkpoint_interval=8) as dump:
+            spans = list(dump.iter_spans())
+            assert [length for _, length in spans] == [len(r) for r in records]
+            assert [tlv.encode() for tlv in dump] == records
+            assert dump.count() == 50
+            assert dump[37].find("70/9F36").get_value() == (37).to_bytes(2, "big")
+            assert dump.read_raw(0) == records[0]
+            assert list(dump.iter_spans(48)) == spans[48:]
+            with pytest.raises(IndexError):
+                dump.read_raw(50)
+
+    def test_seek_before_scan_uses_checkpoints(self, tmp_path):
+        records = make_records(20)
+        path = tmp_path / "dump.ber"
+        path.write_bytes(b"".join(records))
+        with BerTlvFile(str(path), checkpoint_interval=4) as dump:
+            assert dump[13].find("70/9F02").get_value() == (13).to_bytes(6, "big")
+            assert dump[2].find("70/9F02").get_value() == (2).to_bytes(6, "big")
+            assert dump.seek(13) == sum(len(r) for r in records[:13])
+
+    def test_truncated_and_empty_files(self, tmp_path):
+        path = tmp_path / "dump.ber"
+        path.write_bytes(make_records(2)[1][:-1])
+        with BerTlvFile(str(path)) as dump:
+            with pytest.raises(ValueError):
+                list(dump)
+        empty = tmp_path / "empty.ber"
+        empty.write_bytes(b"")
+        with BerTlvFile(str(empty)) as dump:
+            assert list(dump) == [] and dump.count() == 0
+
+    def test_indefinite_length_records(self, tmp_path):
+        records = [bytes.fromhex("70809F36020001A58087010100000000"), bytes.fromhex("5F2A020978")] * 3
+        path = tmp_path / "dump.ber"
+        path.write_bytes(b"".join(records))
+        with BerTlvFile(str(path)) as dump:
+            assert [length for _, length in dump.iter_spans()] == [len(r) for r in records]
+            assert dump[4].find("70/A5/87").get_value() == b"\x01"
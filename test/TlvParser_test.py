@@ -7,7 +7,9 @@ if not '../bit-parser' in sys.path:
     sys.path.insert(1, '../bit-parser')
 
 
-from TlvParser.TlvParser import BerTlvElement, BerTlvParser, BerTlv
+from TlvParser.TlvParser import BerTlvElement, BerTlvParser, BerTlv, BerTlvExtractor, TlvDecodeError, BerTlvLimits, \
+    UNTRUSTED_LIMITS
+from TlvParser.TlvStats import BerTlvStats
 
 
 class TestBitParser:
@@ -202,6 +204,623 @@ class TestBitParser:
         assert "FF" in d and "84" in d["FF"] and "5A" in d["FF"]
 
 
+    def test_parse_bytes_matches_hex(self):
+        hex_str = "6F398408A000000025010403A52D5010414D45524943414E20455850524553538701019F38069F35019F6E045F2D02656EBF0C079F0A0400010102"
+        raw = bytes.fromhex(hex_str)
+        p = BerTlvParser()
+        expected = p.parse_tlv(hex_str)
+        for data in (raw, bytearray(raw), memoryview(raw)):
+            tlv = p.parse_tlv_bytes(data)
+            assert tlv.encode() == expected.encode()
+            assert tlv.find("6F/A5/BF0C/9F0A").get_value_as_hex_str() == "00010102"
+
+    def test_parse_bytes_is_zero_copy(self):
+        raw = bytearray.fromhex("A00A9A032508265F2A020124")
+        tlv = BerTlvParser().parse_tlv_bytes(raw)
+        elem = tlv.find("A0/5F2A")
+        assert elem.get_value_view().obj is raw
+        raw[-1] = 0x25
+        assert elem.get_value_as_hex_str() == "0125"
+
+    def test_parse_bytes_truncated_header_raises(self):
+        p = BerTlvParser()
+        with pytest.raises(IndexError):
+            p.parse_tlv_bytes(bytes.fromhex("9F"))
+        with pytest.raises(IndexError):
+            p.parse_tlv_bytes(bytes.fromhex("A0039F1E"))
+
+
+    def test_lazy_parse_materializes_on_demand(self):
+        hex_str = "6F398408A000000025010403A52D5010414D45524943414E20455850524553538701019F38069F35019F6E045F2D02656EBF0C079F0A0400010102"
+        tlv = BerTlvParser(lazy=True).parse_tlv(hex_str)
+        root = tlv.find("6F/84")
+        fci = tlv.find("6F/A5")
+        assert root.get_value_as_hex_str().upper() == "A000000025010403"
+        assert not fci.is_materialized()
+        assert tlv.find("6F/A5/BF0C/9F0A").get_value_as_hex_str() == "00010102"
+        assert fci.is_materialized()
+        assert tlv.encode() == BerTlvParser().parse_tlv(hex_str).encode()
+
+    def test_lazy_parse_reports_duplicates_on_access(self):
+        tlv = BerTlvParser(lazy=True).parse_tlv("A0085F2A0201245F2A020840")
+        with pytest.raises(LookupError):
+            tlv.find("A0/5F2A")
+
+    def test_lazy_parse_failure_repeats_on_every_access(self):
+        tlv_element = BerTlvParser(lazy=True).parse_tlv("A0045A01AA9F").tlv_elements["A0"]
+        for _ in range(2):
+            with pytest.raises(IndexError):
+                tlv_element.get_children()
+            assert not tlv_element.is_materialized()
+        with pytest.raises(IndexError):
+            tlv_element.encode()
+
+
+    def test_feed_arbitrary_chunks(self):
+        hex_str = "6F398408A000000025010403A52D5010414D45524943414E20455850524553538701019F38069F35019F6E045F2D02656EBF0C079F0A0400010102" \
+                  "9F1E8180" + "00" * 128 + "5F2A00"
+        raw = bytes.fromhex(hex_str)
+        for chunk_size in (1, 2, 7, len(raw)):
+            p = BerTlvParser()
+            done = []
+            for i in range(0, len(raw), chunk_size):
+                done += p.feed(raw[i:i + chunk_size])
+            assert p.is_idle()
+            assert [e.get_tag().hex().upper() for e in done] == ["6F", "9F1E", "5F2A"]
+            assert b"".join(e.encode() for e in done) == raw
+            assert done[0].get_children()["A5"].get_children()["BF0C"].get_children()["9F0A"].get_value() == bytes.fromhex("00010102")
+
+    def test_feed_incomplete_then_close(self):
+        p = BerTlvParser()
+        assert p.feed(bytes.fromhex("9F0206000000")) == []
+        assert not p.is_idle()
+        done = p.feed(bytes.fromhex("0001005A"))
+        assert len(done) == 1 and done[0].get_value_as_hex_str() == "000000000100"
+        with pytest.raises(ValueError):
+            p.close()
+        assert p.is_idle()
+
+
+    def test_compact_element_layout(self):
+        tlv = BerTlvParser().parse_tlv("A00A9A032508265F2A020124")
+        leaf = tlv.find("A0/9A")
+        assert not hasattr(leaf, "__dict__")
+        # leaves do not carry their own children dict until one is asked for
+        assert leaf._BerTlvElement__children_tlvs is None
+        assert len(leaf.get_children()) == 0 and leaf._BerTlvElement__children_tlvs is not None
+        assert leaf.get_value() == bytes.fromhex("250826")
+        leaf.add_value_byte(0x01)
+        assert leaf.get_value_as_hex_str() == "25082601"
+        assert tlv.find("A0/5F2A").get_value_as_hex_str() == "0124"
+
+
+    def test_indexed_find_matches_walk(self):
+        hex_str = "6F398408A000000025010403A52D5010414D45524943414E20455850524553538701019F38069F35019F6E045F2D02656EBF0C079F0A0400010102"
+        plain = BerTlvParser().parse_tlv(hex_str)
+        indexed = BerTlvParser().parse_tlv(hex_str)
+        indexed.build_index()
+        for path in ("6f", "6F/84", "6f/a5/bf0c", "6F/A5/BF0C/9F0A", "6F/A5/87", "6F/99", "A5", "6F/A5/"):
+            assert indexed.find(path) is plain.find(path) or indexed.find(path) == plain.find(path)
+        assert indexed.find("6F/A5/BF0C") is indexed.find("6F/A5/BF0C")
+
+        # with a lazy parse the index only decodes the subtrees lookups reach
+        lazy = BerTlvParser(lazy=True).parse_tlv(hex_str)
+        lazy.build_index()
+        root = lazy.tlv_elements["6F"]
+        assert lazy.find("6F/84").get_value() == bytes.fromhex("A000000025010403")
+        assert not root.get_children()["A5"].is_materialized()
+        assert lazy.find("6F/A5/BF0C/9F0A").get_value() == bytes.fromhex("00010102")
+        assert lazy.find("6F/A5/99") is None and lazy.find("6F/A5/BF0C/9F0A/01") is None
+        assert lazy.find("6F/A5/87") is plain.find("6F/A5/87") or lazy.find("6F/A5/87") == plain.find("6F/A5/87")
+        lazy.find("6F/A5").get_children()["BF0C"].add_child(BerTlvElement(0x9F4D, b"\x0b\x0a"))
+        assert lazy.find("6F/A5/BF0C/9F4D").get_value() == b"\x0b\x0a"
+
+        multi = BerTlv([BerTlvElement(0x84, b"\xAA"), BerTlvElement(0x5A, b"\xBB")], index=True)
+        assert multi.find("ff/5a").get_value_as_hex_str() == "bb"
+        assert multi.find("84").get_value_as_hex_str() == "aa"
+
+    def test_index_follows_insertions(self):
+        tlv = BerTlvParser().parse_tlv("A00A9A032508265F2A020124")
+        tlv.build_index()
+        template = BerTlvElement(0xBF0C, {})
+        tlv.insert_tlv_element("A0", template)
+        template.add_child(BerTlvElement(0x9F0A, bytes.fromhex("00010102")))
+        assert tlv.find("A0/BF0C/9F0A").get_value_as_hex_str() == "00010102"
+        tlv.insert_tlv_element("A0/BF0C", BerTlvElement(0x9F02, bytes.fromhex("000000000100")))
+        assert tlv.find("a0/bf0c/9f02").get_value_as_hex_str() == "000000000100"
+        with pytest.raises(LookupError):
+            tlv.insert_tlv_element("A0", BerTlvElement(0x9A, bytes.fromhex("250827")))
+        tlv.drop_index()
+        assert tlv.find("A0/BF0C/9F0A").get_value_as_hex_str() == "00010102"
+
+
+    def test_extractor_paths_and_wildcards(self):
+        hex_str = "6F398408A000000025010403A52D5010414D45524943414E20455850524553538701019F38069F35019F6E045F2D02656EBF0C079F0A0400010102"
+        tlv = BerTlvParser().parse_tlv(hex_str)
+        extractor = BerTlvExtractor(["6F/84", "*/A5/87", "**/9F0A", "**/9F02", "6f/a5/bf0c"])
+        found = extractor.extract(tlv)
+        assert found["6F/84"] is tlv.find("6F/84")
+        assert found["*/A5/87"].get_value_as_hex_str() == "01"
+        assert found["**/9F0A"].get_value_as_hex_str() == "00010102"
+        assert found["**/9F02"] is None
+        assert found["6f/a5/bf0c"] is tlv.find("6F/A5/BF0C")
+        assert extractor.extract_tuple(bytes.fromhex(hex_str))[2].get_value_as_hex_str() == "00010102"
+
+    def test_extractor_all_matches_in_document_order(self):
+        tlv = BerTlvParser().parse_tlv("E00C9F0201015F2A0209785A01AAE1049F020102")
+        matches = BerTlvExtractor(["**/9F02", "ff/e1/*"]).extract_all(tlv)
+        assert [e.get_value_as_hex_str() for e in matches["**/9F02"]] == ["01", "02"]
+        assert [e.get_value_as_hex_str() for e in matches["ff/e1/*"]] == ["02"]
+
+    def test_extractor_skips_unmatched_lazy_subtrees(self):
+        hex_str = "6F398408A000000025010403A52D5010414D45524943414E20455850524553538701019F38069F35019F6E045F2D02656EBF0C079F0A0400010102"
+        tlv = BerTlvParser(lazy=True).parse_tlv(hex_str)
+        assert BerTlvExtractor(["6F/84"]).extract(tlv)["6F/84"] is not None
+        assert not tlv.find("6F/A5").is_materialized()
+
+
+    def test_projection_parse_keeps_only_wanted_paths(self):
+        hex_str = "6F398408A000000025010403A52D5010414D45524943414E20455850524553538701019F38069F35019F6E045F2D02656EBF0C079F0A0400010102"
+        tlv = BerTlvParser().parse_tlv_projection(bytes.fromhex(hex_str), ["6F/A5/87", "**/9F0A"])
+        assert tlv.find("6F/A5/87").get_value_as_hex_str() == "01"
+        assert tlv.find("6F/A5/BF0C/9F0A").get_value_as_hex_str() == "00010102"
+        assert tlv.find("6F/84") is None and tlv.find("6F/A5/50") is None
+        assert list(tlv.find("6F/A5").get_children()) == ["87", "BF0C"]
+
+    def test_paths_mean_the_same_everywhere(self):
+        raw = bytes.fromhex("9F0A0101" + "6F398408A000000025010403A52D5010414D45524943414E20455850524553538701019F38069F35019F6E045F2D02656EBF0C079F0A0400010102")
+        for path, expected in (("9F0A", "01"), ("**/9F0A", "01"), ("6F/**/9F0A", "00010102"), ("*/9F0A", None)):
+            found = BerTlvExtractor([path]).extract(raw)[path]
+            assert (found.get_value_as_hex_str() if found is not None else None) == expected
+            projected = BerTlvParser().parse_tlv_projection(raw, [path])
+            assert (BerTlvExtractor([path]).extract(projected)[path] if projected is not None else None) == found
+            [fields] = BerTlvParser().parse_many([raw], workers=0, paths=[path])
+            assert fields[path] == (bytes.fromhex(expected) if expected is not None else None)
+        # a bare tag does not match below the top level
+        assert BerTlvParser().parse_tlv_projection(raw[4:], ["9F0A"]) is None
+        assert BerTlvExtractor(["9F0A"]).extract(raw[4:])["9F0A"] is None
+
+    def test_projection_parse_wanted_constructed_is_complete(self):
+        hex_str = "E00C9F0201015F2A0209785A01AAE1049F020102"
+        tlv = BerTlvParser().parse_tlv_projection(bytes.fromhex(hex_str), ["E1"])
+        assert list(tlv.tlv_elements) == ["E1"]
+        assert tlv.encode() == bytes.fromhex("E1049F020102")
+        assert BerTlvParser().parse_tlv_projection(bytes.fromhex(hex_str), ["DF01"]) is None
+
+
+    def test_encode_into_caller_buffer(self):
+        parent = BerTlvElement(0xA0, {})
+        parent.add_child(BerTlvElement(0x9A, bytes.fromhex("250826")))
+        parent.add_child(BerTlvElement(0x5F2A, bytes.fromhex("0124")))
+        expected = bytes.fromhex("A00A9A032508265F2A020124")
+        assert parent.get_encoded_length() == len(expected)
+        buf = bytearray(b"\xEE" * (len(expected) + 4))
+        assert parent.encode_into(buf, 2) == 2 + len(expected)
+        assert buf[2:-2] == expected and buf[:2] == b"\xEE\xEE" and buf[-2:] == b"\xEE\xEE"
+        with pytest.raises(ValueError):
+            parent.encode_into(bytearray(len(expected) - 1))
+
+    def test_encode_wide_and_long_values(self):
+        parent = BerTlvElement(0xE0, {})
+        for tag in range(0xDF01, 0xDF80):
+            parent.add_child(BerTlvElement(tag, bytes([tag & 0xFF]) * 200))
+        tlv = BerTlv(parent)
+        enc = tlv.encode()
+        assert len(enc) == tlv.get_encoded_length()
+        reparsed = BerTlvParser().parse_tlv_bytes(enc)
+        assert reparsed.encode() == enc
+        leaf = reparsed.find("E0/DF05")
+        assert leaf.get_length() == 200 and leaf == parent.get_children()["DF05"]
+
+
+    def test_encode_cache_invalidated_along_dirty_path(self):
+        hex_str = "6F398408A000000025010403A52D5010414D45524943414E20455850524553538701019F38069F35019F6E045F2D02656EBF0C079F0A0400010102"
+        tlv = BerTlvParser().parse_tlv(hex_str)
+        root = tlv.find("6F/A5").get_parent()
+        first = root.encode()
+        assert root.encode() is first
+        label, fci, dfname = tlv.find("6F/A5/50"), tlv.find("6F/A5"), tlv.find("6F/84")
+        assert label.is_encoding_cached() and dfname.is_encoding_cached()
+
+        tlv.find("6F/A5/BF0C/9F0A").set_value_bytes(bytes.fromhex("0001010203"))
+        assert not fci.is_encoding_cached() and not root.is_encoding_cached()
+        assert label.is_encoding_cached() and dfname.is_encoding_cached()
+        cached_label = label._BerTlvElement__encoded
+
+        second = tlv.encode()
+        assert second == BerTlvParser().parse_tlv_bytes(second).encode()
+        assert tlv.find("6F/A5/BF0C/9F0A").get_value_as_hex_str() == "0001010203"
+        assert second[1] == first[1] + 1
+        # the untouched sibling was copied from its cache, not re-encoded
+        assert label._BerTlvElement__encoded is cached_label
+
+        fci.add_child(BerTlvElement(0x9F02, bytes.fromhex("000000000100")))
+        assert not root.is_encoding_cached()
+        assert root.encode().endswith(bytes.fromhex("9F0206000000000100"))
+
+    def test_element_has_a_single_parent(self):
+        import copy
+        date = BerTlvElement(0x9A, b"\x01")
+        first, second = BerTlvElement(0xA0, {}), BerTlvElement(0xA1, {})
+        first.add_child(date)
+        assert first.encode().hex() == "a0039a0101"
+        with pytest.raises(ValueError):
+            second.add_child(date)
+        with pytest.raises(ValueError):
+            BerTlvElement(0xA1, {"9A": date})
+        date_copy = copy.deepcopy(date)
+        assert date_copy.get_parent() is None
+        second.add_child(date_copy)
+        assert second.encode().hex() == "a1039a0101"
+        date.set_value_bytes(b"\x02")
+        assert first.encode().hex() == "a0039a0102" and second.encode().hex() == "a1039a0101"
+
+        # a replaced child is released and can be added elsewhere
+        first.replace_child("9A", BerTlvElement(0x9A, b"\x03"))
+        assert date.get_parent() is None
+        second.replace_child("9A", date)
+        assert second.encode().hex() == "a1039a0102"
+
+    def test_pickle_roundtrip_of_parsed_tree(self):
+        import copy
+        import pickle
+        hex_str = "6F398408A000000025010403A52D5010414D45524943414E20455850524553538701019F38069F35019F6E045F2D02656EBF0C079F0A0400010102"
+        tlv = BerTlvParser(lazy=True).parse_tlv_bytes(bytearray.fromhex(hex_str))
+        tlv.build_index()
+        clone = pickle.loads(pickle.dumps(tlv))
+        assert clone.encode() == tlv.encode()
+        assert clone.find("6F/A5/BF0C/9F0A").get_parent() is clone.find("6F/A5/BF0C")
+        assert copy.deepcopy(tlv).find("6F/A5/87").get_value_as_hex_str() == "01"
+
+    def test_parse_many_in_order(self):
+        fci = "6F398408A000000025010403A52D5010414D45524943414E20455850524553538701019F38069F35019F6E045F2D02656EBF0C079F0A0400010102"
+        messages = []
+        for n in range(40):
+            amount = BerTlvElement(0x9F02, n.to_bytes(6, "big"))
+            messages.append(amount.encode() + bytes.fromhex("5F2A020978") if n % 2 else fci)
+
+        for workers in (0, 2):
+            trees = list(BerTlvParser().parse_many(messages, workers=workers, chunksize=3))
+            assert len(trees) == 40
+            assert trees[0].encode().hex().upper() == fci
+            assert trees[7].find("9F02").get_value() == (7).to_bytes(6, "big")
+
+            extracted = list(BerTlvParser().parse_many(messages, workers=workers, chunksize=3,
+                                                       paths=["9F02", "**/9F0A"]))
+            assert extracted[5] == {"9F02": (5).to_bytes(6, "big"), "**/9F0A": None}
+            assert extracted[4] == {"9F02": None, "**/9F0A": bytes.fromhex("00010102")}
+
+            compact = list(BerTlvParser().parse_many(messages, workers=workers, chunksize=7, compact=True))
+            assert compact[1] == {"9F02": (1).to_bytes(6, "big"), "5F2A": bytes.fromhex("0978")}
+            assert compact[0]["6F/A5/BF0C/9F0A"] == bytes.fromhex("00010102")
+
+    def test_parse_many_uses_the_parser_configuration(self):
+        fci = bytes.fromhex("6F398408A000000025010403A52D5010414D45524943414E20455850524553538701019F38069F35019F6E045F2D02656EBF0C079F0A0400010102")
+        hostile = bytes.fromhex("9F1E84FFFFFFFF00")
+        for workers in (0, 2):
+            assert list(BerTlvParser().parse_many([hostile], workers=workers))[0] is not None   # clamped
+            with pytest.raises(TlvDecodeError) as e:
+                list(BerTlvParser(limits=UNTRUSTED_LIMITS).parse_many([fci, hostile], workers=workers))
+            assert e.value.offset == 0
+
+            stats = BerTlvStats()
+            [tlv, _] = BerTlvParser(stats=stats).parse_many([fci, fci], workers=workers)
+            assert stats.messages == 2 and stats.elements == 18 and stats.bytes == 2 * len(fci)
+            tlv.find("6F/A5/87")
+            assert stats.lookups == 1
+
+        [tlv] = BerTlvParser(lazy=True).parse_many([fci], workers=0)
+        assert not tlv.find("6F/A5").is_materialized()
+
+
+    def test_indefinite_length_decoding(self):
+        # 70 80 { 9F36 02 0001  A5 80 { 87 01 01 } 00 00 } 00 00  5F2A 02 0978
+        hex_str = "70809F36020001A58087010100000000" + "5F2A020978"
+        tlv = BerTlvParser().parse_tlv(hex_str)
+        outer = tlv.find("70")
+        assert outer.is_length_indefinite() and outer.get_length() == 12
+        assert tlv.find("70/A5").is_length_indefinite()
+        assert tlv.find("70/A5/87").get_value_as_hex_str() == "01"
+        assert tlv.find("5F2A").get_value_as_hex_str() == "0978"
+        assert tlv.encode().hex().upper() == hex_str
+        assert BerTlvParser().parse_tlv_projection(bytes.fromhex(hex_str), ["5F2A"]).encode().hex().upper() == "5F2A020978"
+        outer.set_length_indefinite(False)
+        assert outer.encode().hex().upper() == "700C9F36020001A580870101" + "0000"
+
+    def test_indefinite_length_errors(self):
+        p = BerTlvParser()
+        with pytest.raises(IndexError):
+            p.parse_tlv("70809F36020001")            # no end-of-contents
+        with pytest.raises(ValueError):
+            p.parse_tlv("9F3680")                    # primitive cannot be indefinite
+        with pytest.raises(ValueError):
+            p.feed(bytes.fromhex("9F3680"))
+
+    def test_feed_indefinite_length(self):
+        raw = bytes.fromhex("70809F36020001A58087010100000000" + "5F2A020978" + "E18000005A01AA")
+        for chunk_size in (1, 3, len(raw)):
+            p = BerTlvParser()
+            done = []
+            for i in range(0, len(raw), chunk_size):
+                done += p.feed(raw[i:i + chunk_size])
+            assert [e.get_tag().hex().upper() for e in done] == ["70", "5F2A", "E1", "5A"]
+            assert b"".join(e.encode() for e in done) == raw
+            assert done[0].get_children()["A5"].get_children()["87"].get_value() == b"\x01"
+            assert p.is_idle()
+
+    def test_repeated_tags_share_interned_metadata(self):
+        first = BerTlvParser().parse_tlv_bytes(bytes.fromhex("9F0206000000000100"))
+        second = BerTlvParser().parse_tlv_bytes(bytes.fromhex("E1039F0200"))
+        tags = [first.tlv_elements["9F02"].get_tag(), second.find("E1/9F02").get_tag()]
+        assert all(t is tags[0] for t in tags)
+        assert BerTlvElement(0x9F02).get_tag() is BerTlvElement(b"\x9f\x02").get_tag()
+        # the constructed bit is still recomputed when a primitive tag gets children
+        promoted = BerTlvElement(0x5A)
+        promoted.add_child(BerTlvElement(0x9F02, b"\x01"))
+        assert promoted.encode().hex().upper() == "7A049F020101"
+
+    def test_patch_value_in_place(self):
+        parser = BerTlvParser()
+        tx = BerTlvElement(0x77)
+        tx.add_child(BerTlvElement(0x9F36, bytes.fromhex("0041")))
+        tx.add_child(BerTlvElement(0x9F02, bytes.fromhex("000000001500")))
+        # parsed values would be views of raw and pin it, so checks below parse a copy
+        raw = bytearray(BerTlvElement(0x9F1A, bytes.fromhex("0840")).encode() + tx.encode())
+
+        # same size: bytes are overwritten, nothing moves
+        before = len(raw)
+        assert parser.patch_value(raw, "77/9F36", bytes.fromhex("0042")) == 0
+        assert len(raw) == before
+        assert parser.parse_tlv_bytes(bytes(raw)).find("77/9F36").get_value() == bytes.fromhex("0042")
+
+        # growth past 127 bytes switches 77 to a long-form length
+        delta = parser.patch_value(raw, "FF/77/9F02", bytes(200))
+        assert delta == 194 + 1 + 1   # value, then one more length octet each for 9F02 and 77
+        tlv = parser.parse_tlv_bytes(bytes(raw))
+        assert tlv.find("77/9F02").get_value() == bytes(200)
+        assert bytes(raw[5:8]).hex().upper() == "7781D1"
+        assert tlv.find("9F1A").get_value_as_hex_str() == "0840"
+
+        # shrinking keeps the existing long-form field sizes
+        parser.patch_value(raw, "77/9F02", bytes.fromhex("000000000100"))
+        assert bytes(raw[5:8]).hex().upper() == "77810F"   # 9F02 keeps its 81 06 length field too
+        assert parser.parse_tlv_bytes(bytes(raw)).find("77/9F02").get_value_as_bcd() == 100
+
+        # indefinite-length ancestors are left alone
+        indefinite = bytearray.fromhex("70809F3602000100005A01AA")
+        parser.patch_value(indefinite, "70/9F36", b"\x02")
+        assert indefinite.hex().upper() == "70809F360102" + "0000" + "5A01AA"
+
+        with pytest.raises(LookupError):
+            parser.patch_value(raw, "77/9F37", b"\x00")
+        with pytest.raises(LookupError):
+            parser.patch_value(raw, "77/9F36/9F36", b"\x00")   # 9F36 is primitive
+        with pytest.raises(LookupError):
+            parser.patch_value(bytearray.fromhex("5A01AA"), "5A/01", b"\x00")
+        with pytest.raises(TypeError):
+            parser.patch_value(bytes(raw), "77/9F36", b"\x00")
+
+    def test_scan_offsets_table(self):
+        raw = bytes.fromhex(
+            "6F398408A000000025010403A52D5010414D45524943414E20455850524553538701019F38069F35019F6E045F2D02656EBF0C079F0A0400010102"
+            + "70809F36020001A58087010100000000")
+        table = BerTlvParser().scan(raw)
+        assert len(table) == 13
+        assert table[0] == (0, 0x6F, 0, 2, 0x39, -1)
+        assert [table.tag[r] for r in table.children(-1)] == [0x6F, 0x70]
+        assert [table.tag[r] for r in table.children(table.find("6F/A5"))] == [0x50, 0x87, 0x9F38, 0x5F2D, 0xBF0C]
+        row = table.find("6F/A5/BF0C/9F0A")
+        assert table.depth[row] == 3 and bytes(table.value(row)).hex().upper() == "00010102"
+        assert table[table.parent[row]].tag == 0xBF0C
+        assert bytes(table.value(table.find("70/A5/87"))) == b"\x01"
+        assert table.length[table.find("70")] == 12   # without its own end-of-contents
+        assert table.find("6F/A5/9F99") is None
+        assert table.find("FF/6F/A5/50") == table.find("6F/A5/50") == 3
+        for path in ("6F/**/50", "6F//50", "6F/A5/5", ""):
+            with pytest.raises(ValueError, match="tag names"):
+                table.find(path)
+
+    def test_scan_errors_report_offsets(self):
+        parser = BerTlvParser()
+        with pytest.raises(TlvDecodeError) as e:
+            parser.scan(bytes.fromhex("5A01AA" + "6F059F3605000102"))
+        assert e.value.offset == 5 and isinstance(e.value, ValueError)
+        with pytest.raises(TlvDecodeError) as e:
+            parser.scan(bytes.fromhex("5A01AA9F"))
+        assert e.value.offset == 3
+        with pytest.raises(TlvDecodeError) as e:
+            parser.scan(bytes.fromhex("70809F360100"))
+        assert e.value.offset == 0
+
+    @staticmethod
+    def nested(levels):
+        data = bytes.fromhex("5A01AA")
+        for _ in range(levels):
+            n = len(data)
+            length = bytes([n]) if n < 128 else bytes([0x80 | ((n.bit_length() + 7) // 8)]) + n.to_bytes((n.bit_length() + 7) // 8, "big")
+            data = b"\xE1" + length + data
+        return data
+
+    def test_deep_nesting_needs_no_recursion(self):
+        data = self.nested(5000)
+        tlv = BerTlvParser().parse_tlv_bytes(data)
+        tlv_element = tlv.tlv_elements["E1"]
+        for _ in range(4999):
+            tlv_element = tlv_element.get_children()["E1"]
+        assert tlv_element.get_children()["5A"].get_value() == b"\xAA"
+        assert tlv.encode() == data
+        tlv_element.get_children()["5A"].set_value_bytes(b"\xBB")
+        assert tlv.encode() == data[:-1] + b"\xBB"
+
+    def test_limits_reject_hostile_input(self):
+        parser = BerTlvParser(limits=UNTRUSTED_LIMITS)
+        assert parser.parse_tlv_bytes(self.nested(16)) is not None
+        with pytest.raises(TlvDecodeError) as e:
+            parser.parse_tlv_bytes(self.nested(17))
+        assert e.value.offset == 17 * 2   # the 5A below the 17th E1 header
+
+        with pytest.raises(TlvDecodeError):
+            BerTlvParser(limits=BerTlvLimits(max_elements=3)).parse_tlv_bytes(bytes.fromhex("5A01AA" * 4))
+        with pytest.raises(TlvDecodeError) as e:
+            parser.parse_tlv_bytes(bytes.fromhex("5A01AA" + "9F3684FFFFFFFF00"))
+        assert e.value.offset == 3
+        with pytest.raises(TlvDecodeError) as e:
+            parser.parse_tlv_bytes(bytes.fromhex("70049F360500"))   # overrun is an error, not clamped
+        assert e.value.offset == 2
+        with pytest.raises(TlvDecodeError):
+            BerTlvParser(limits=BerTlvLimits(max_size=8)).parse_tlv_bytes(bytes(9))
+        with pytest.raises(ValueError):
+            BerTlvParser(lazy=True, limits=UNTRUSTED_LIMITS)
+
+        # limits assigned later apply to every entry point
+        parser = BerTlvParser()
+        assert parser.parse_tlv_bytes(self.nested(40)) is not None
+        parser.limits = UNTRUSTED_LIMITS
+        with pytest.raises(TlvDecodeError):
+            parser.parse_tlv_bytes(self.nested(40))
+        parser.limits = None
+        assert parser.parse_tlv_bytes(self.nested(40)) is not None
+        with pytest.raises(ValueError):
+            BerTlvParser(lazy=True).limits = UNTRUSTED_LIMITS
+
+        # an indefinite length on a primitive tag is a decode error too
+        for parse in (lambda data: parser.parse_tlv_bytes(data), lambda data: parser.parse_tlv_projection(data, ["**/5A"])):
+            parser.limits = UNTRUSTED_LIMITS
+            with pytest.raises(TlvDecodeError) as e:
+                parse(bytes.fromhex("5A01AA" + "D8801A94950000"))
+            assert e.value.offset == 3
+
+    def test_projection_is_iterative_and_limited(self):
+        data = self.nested(3000)
+        tlv = BerTlvParser().parse_tlv_projection(data, ["**/5A"])
+        assert tlv.encode() == data   # the 5A is under every E1
+        assert BerTlvExtractor(["**/5A"]).extract(data)["**/5A"].get_value() == b"\xAA"
+        assert BerTlvExtractor(["E1"]).extract(data)["E1"].encode() == data
+        hostile = bytes.fromhex("9F1E84FFFFFFFF00")
+        for parser in (BerTlvParser(limits=UNTRUSTED_LIMITS), BerTlvParser(limits=BerTlvLimits(max_size=8))):
+            with pytest.raises(TlvDecodeError):
+                parser.parse_tlv_projection(data, ["**/5A"])
+            with pytest.raises(TlvDecodeError):
+                BerTlvExtractor(["**/5A"], parser).extract(data)
+        with pytest.raises(TlvDecodeError) as e:
+            BerTlvParser(limits=UNTRUSTED_LIMITS).parse_tlv_projection(hostile, ["9F1E"])
+        assert e.value.offset == 0
+        for workers in (0, 2):
+            with pytest.raises(TlvDecodeError):
+                list(BerTlvParser(limits=UNTRUSTED_LIMITS).parse_many([hostile], workers=workers, paths=["9F1E"]))
+
+    def test_deep_trees_pickle_and_copy(self):
+        import copy
+        import pickle
+        data = self.nested(3000)
+        tlv = BerTlvParser().parse_tlv_bytes(data)
+        assert pickle.loads(pickle.dumps(tlv)).encode() == data
+        tlv_element = copy.deepcopy(tlv.tlv_elements["E1"])
+        assert tlv_element.get_parent() is None
+        assert tlv_element == tlv.tlv_elements["E1"]
+        assert tlv_element.get_children()["E1"].get_parent() is tlv_element
+
+    def test_limits_on_feed(self):
+        parser = BerTlvParser(limits=BerTlvLimits(max_length_of_length=2, max_size=64))
+        assert [e.get_tag() for e in parser.feed(bytes.fromhex("5A01AA"))] == [b"\x5A"]
+        with pytest.raises(TlvDecodeError) as e:
+            parser.feed(bytes.fromhex("9F3683"))
+        assert e.value.offset == 3
+        with pytest.raises(TlvDecodeError):
+            parser.feed(bytes.fromhex("9F368200FF"))
+        with pytest.raises(TlvDecodeError):
+            parser.feed(bytes.fromhex("7080") + bytes.fromhex("5A01AA") * 30)
+        assert parser.is_idle()
+
+    def test_feed_recovers_after_a_malformed_element(self):
+        parser = BerTlvParser()
+        with pytest.raises(TlvDecodeError) as e:
+            parser.feed(bytes.fromhex("5A01AA" + "A0085F2A0201245F2A020840"))   # duplicate 5F2A
+        assert e.value.offset == 3 and isinstance(e.value.__cause__, LookupError)
+        assert parser.is_idle()
+        done = parser.feed(bytes.fromhex("9F360200"))
+        done += parser.feed(bytes.fromhex("42"))
+        assert [(t.get_tag(), t.get_value()) for t in done] == [(b"\x5A", b"\xAA"), (b"\x9F\x36", b"\x00\x42")]
+
+        # limit violations below a fed element report stream offsets
+        parser = BerTlvParser(limits=BerTlvLimits(max_depth=1))
+        with pytest.raises(TlvDecodeError) as e:
+            parser.feed(bytes.fromhex("5A01AA" + "E105E1035A01AA"))
+        assert e.value.offset == 7
+        assert [t.get_tag() for t in parser.feed(bytes.fromhex("E1035A01BB"))] == [b"\x5A", b"\xE1"]
+
+    def test_digests_equality_and_diff(self):
+        fci = "6F398408A000000025010403A52D5010414D45524943414E20455850524553538701019F38069F35019F6E045F2D02656EBF0C079F0A0400010102"
+        old = BerTlvParser().parse_tlv(fci).tlv_elements["6F"]
+        new = BerTlvParser().parse_tlv(fci).tlv_elements["6F"]
+        assert old == new and old.get_digest() == new.get_digest()
+        new = BerTlvParser().parse_tlv("6F2F" + fci[24:]).tlv_elements["6F"]   # without 84
+        # the declared length counts, as in the element-wise comparison
+        assert BerTlvParser().parse_tlv("A5055A03112233").tlv_elements["A5"] != \
+            BerTlvParser().parse_tlv("A581055A03112233").tlv_elements["A5"]
+        assert BerTlvParser().parse_tlv("5A03112233").tlv_elements["5A"] == BerTlvElement(0x5A, b"\x11\x22\x33")
+        # the length is the one encode() writes, so stored length octets never go stale
+        declared = BerTlvElement(0x5A, b"\x11\x22\x33")
+        declared.set_length(4)
+        assert declared == BerTlvElement(0x5A, b"\x11\x22\x33")
+        built = BerTlvElement(0x70)
+        built.add_child(BerTlvElement(0x5A, b"\xAA"))
+        assert built == BerTlvParser().parse_tlv("70035A01AA").tlv_elements["70"]
+        edited = BerTlvParser().parse_tlv("5A01AA").tlv_elements["5A"]
+        edited.set_value_bytes(b"\xAA\xBB")
+        assert edited == BerTlvParser().parse_tlv("5A02AABB").tlv_elements["5A"]
+        edited.set_value_bytes(bytes(200))
+        assert edited == BerTlvParser().parse_tlv("5A81C8" + "00" * 200).tlv_elements["5A"]
+        assert edited != BerTlvParser().parse_tlv("5A8200C8" + "00" * 200).tlv_elements["5A"]
+        short, long = (BerTlvParser().parse_tlv(h).tlv_elements["A5"] for h in ("A5055A03112233", "A581055A03112233"))
+        assert [entry.path for entry in short.diff(long)] == ["A5"]   # only the length form differs
+
+        # values aliasing a writable buffer are hashed on every comparison
+        raw = bytearray.fromhex("70035A01AA")
+        aliased = BerTlvParser().parse_tlv_bytes(raw).tlv_elements["70"]
+        assert aliased == BerTlvParser().parse_tlv("70035A01AA").tlv_elements["70"]
+        assert aliased.encode().hex().upper() == "70035A01AA"
+        raw[-1] = 0xBB
+        assert aliased == BerTlvParser().parse_tlv("70035A01BB").tlv_elements["70"]
+        assert aliased.encode().hex().upper() == "70035A01BB"   # nor is their encoding cached
+        BerTlvParser().patch_value(raw, "70/5A", b"\xCC")
+        assert aliased.encode().hex().upper() == "70035A01CC"
+
+        a5 = new.get_children()["A5"]
+        a5.get_children()["87"].set_value_bytes(b"\x02")
+        assert old != new
+        a5.add_child(BerTlvElement(0x9F4D, b"\x0b\x0a"))
+        a5.get_children()["BF0C"].replace_child("9F0A", BerTlvElement(0x9F0B, b"\x01"))
+        assert [(entry.path, entry.old is None, entry.new is None) for entry in old.diff(new)] == [
+            ("6F/84", False, True),
+            ("6F/A5/87", False, False),
+            ("6F/A5/BF0C/9F0A", False, False),
+            ("6F/A5/9F4D", True, False)]
+        assert old.diff(old) == []
+
+        old = BerTlvParser().parse_tlv("5A01AA9F360200019F370400000000")
+        new = BerTlvParser().parse_tlv("5A01AA9F360200029F370400000000")
+        assert [entry.path for entry in old.diff(new)] == ["9F36"]
+        assert old.diff(new)[0].new.get_value() == b"\x00\x02"
+
+        # reordered children are reported on their parent
+        old = BerTlvParser().parse_tlv("70075A01AA5F2401BB").tlv_elements["70"]
+        new = BerTlvParser().parse_tlv("70075F2401BB5A01AA").tlv_elements["70"]
+        assert [entry.path for entry in old.diff(new)] == ["70"]
+
+    def test_digest_of_deep_tree(self):
+        old = BerTlvParser().parse_tlv_bytes(self.nested(5000)).tlv_elements["E1"]
+        new = BerTlvParser().parse_tlv_bytes(self.nested(5000)).tlv_elements["E1"]
+        assert old == new
+        leaf = new
+        for _ in range(5000):
+            leaf = leaf.get_children()["E1" if "E1" in leaf.get_children() else "5A"]
+        leaf.set_value_bytes(b"\xBB")
+        assert old != new
+        [entry] = old.diff(new)
+        assert entry.path.count("/") == 5000 and entry.new is leaf
+
+
 from hypothesis import given, strategies as st
 
 @given(tag=st.integers(min_value=0x01, max_value=0x1E),  # simple 1-byte tags (avoid constructed/high-tag-number here)
@@ -0,0 +1,69 @@
+from datetime import date
+
+import pytest
+
+from TlvParser.TlvParser import BerTlvElement
+from TlvParser.TlvSchema import BerTlvSchema
+from test.helpers import transaction
+
+
+def generate_ac_schema():
+    schema = BerTlvSchema(name="GenerateAc")
+    schema.register("77", constructed=True)
+    schema.register("9F02", "amount", "bcd", length=6)
+    schema.register("5F2A", "currency", "bcd", length=2)
+    schema.register("9A", "date", "date", length=3)
+    schema.register(0x9F36, "atc", "int", length=2)
+    schema.register("9F26", "cryptogram", "hex", length=8)
+    schema.register("50", "label", "str", max_length=16)
+    return schema
+
+
+class TestTlvSchema:
+
+    def test_decode_into_named_fields(self):
+        decoder = generate_ac_schema().compile()
+        record = decoder.decode(transaction(currency=978, atc=0x42,
+                                             extra=[(0x9A, "261018"), (0x9F26, "8E4A1C2B3D4E5F60"), (0x9F27, "80")]))
+        assert record.amount == 1500 and record.currency == 978 and record.atc == 0x42
+        assert record.date == date(2026, 10, 18)
+        assert record.cryptogram == "8E4A1C2B3D4E5F60"
+        assert record.label is None
+        assert [e.get_tag().hex().upper() for e in record.unknown] == ["9F27"]
+        assert type(record).__name__ == "GenerateAc"
+
+    def test_indefinite_container_and_dict_schema(self):
+        schema = BerTlvSchema({"70": {"constructed": True}, "5A": {"name": "pan", "kind": "cn"}})
+        record = schema.compile().decode(memoryview(bytes.fromhex("70805A0841111111111111110000")))
+        assert record.pan == "4111111111111111" and record.unknown == []
+
+    def test_nested_containers(self):
+        schema = generate_ac_schema()
+        schema.register("70", constructed=True)
+        decoder = schema.compile()
+        inner = BerTlvElement(0x70)
+        inner.add_child(BerTlvElement(0x50, b"VISA"))
+        outer = BerTlvElement(0x77)
+        outer.add_child(inner)
+        hidden = BerTlvElement(0xA5)
+        hidden.add_child(BerTlvElement(0x9F36, b"\x00\x07"))
+        outer.add_child(hidden)
+        record = decoder.decode(outer.encode())
+        assert record.label == "VISA"               # registered containers are descended into
+        assert record.atc is None                   # unregistered ones are kept whole
+        assert [e.get_tag().hex().upper() for e in record.unknown] == ["A5"]
+        assert record.unknown[0].get_children()["9F36"].get_value() == b"\x00\x07"
+
+    def test_schema_violations(self):
+        decoder = generate_ac_schema().compile()
+        with pytest.raises(ValueError):
+            decoder.decode(bytes.fromhex("77059F360300"))     # declared longer than the buffer
+        with pytest.raises(ValueError):
+            decoder.decode(bytes.fromhex("9F3603000001"))     # wrong fixed length
+        with pytest.raises(ValueError):
+            decoder.decode(bytes.fromhex("5011") + b"X" * 17)  # over max length
+        with pytest.raises(ValueError):
+            BerTlvSchema().register("9F02", kind="bcd")        # primitive without a field name
+        for malformed in ("BC80", "BC809F", "7780" + "9F3602", "A70653DC4AB50F88CF6F64", "A7045A005A00"):
+            with pytest.raises(ValueError, match="offset"):     # truncated, no end-of-contents, duplicate tag
+                decoder.decode(bytes.fromhex(malformed))
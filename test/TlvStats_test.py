@@ -0,0 +1,57 @@
+import pytest
+
+from TlvParser.TlvParser import BerTlvParser
+from TlvParser.TlvStats import BerTlvStats
+
+
+FCI = bytes.fromhex("6F398408A000000025010403A52D5010414D45524943414E20455850524553538701019F38069F35019F6E045F2D02656EBF0C079F0A0400010102")
+
+
+class TestTlvStats:
+
+    def test_counters(self):
+        stats = BerTlvStats()
+        tlv = BerTlvParser(stats=stats).parse_tlv_bytes(FCI)
+        assert tlv.find("6F/A5/BF0C/9F0A").get_value_as_hex_str() == "00010102"
+        assert tlv.find("6F/9F99") is None
+
+        counters = stats.as_dict()
+        assert counters["tlv_messages_total"] == 1
+        assert counters["tlv_bytes_total"] == len(FCI)
+        assert counters["tlv_elements_total"] == 9
+        assert counters["tlv_constructed_elements_total"] == 3
+        assert counters["tlv_max_depth"] == 3
+        assert counters["tlv_lookups_total"] == 2
+        assert counters["tlv_lookup_misses_total"] == 1
+        assert "tlv_header_seconds_total" not in counters
+
+    def test_timing_and_hooks(self):
+        stats = BerTlvStats(timing=True)
+        seen = []
+        stats.add_hook("element", lambda tlv_element, depth: seen.append((tlv_element.get_tag().hex().upper(), depth)))
+        parser = BerTlvParser(lazy=True, stats=stats)
+        tlv = parser.parse_tlv_bytes(FCI)
+        assert seen == [("6F", 0)]
+        tlv.find("6F/A5/BF0C/9F0A")
+        assert ("BF0C", 2) in seen and ("9F0A", 3) in seen
+
+        counters = stats.as_dict()
+        for phase in BerTlvStats.PHASES:
+            assert counters[f"tlv_{phase}_seconds_total"] >= 0.0
+        assert counters["tlv_parse_seconds_total"] > 0.0
+
+        with pytest.raises(ValueError):
+            stats.add_hook("nope", print)
+        stats.reset()
+        assert stats.as_dict()["tlv_elements_total"] == 0
+
+    def test_feed_counts_completed_elements(self):
+        stats = BerTlvStats()
+        parser = BerTlvParser(stats=stats)
+        for i in range(0, len(FCI), 7):
+            parser.feed(FCI[i:i + 7])
+        assert stats.messages == 1 and stats.elements == 9 and stats.bytes == len(FCI)
+
+    def test_plain_parser_has_no_stats(self):
+        tlv = BerTlvParser().parse_tlv_bytes(FCI)
+        assert tlv.stats is None
@@ -0,0 +1,92 @@
+import asyncio
+import io
+
+import pytest
+
+from TlvParser.TlvParser import BerTlvElement, BerTlvParser, TlvDecodeError, UNTRUSTED_LIMITS
+from TlvParser.TlvStream import BerTlvStreamEncoder, BerTlvStreamReader, open_tlv_connection
+
+
+FCI = bytes.fromhex("6F398408A000000025010403A52D5010414D45524943414E20455850524553538701019F38069F35019F6E045F2D02656EBF0C079F0A0400010102")
+
+
+class TestTlvStream:
+
+    def test_loopback_roundtrip(self):
+        async def handle(reader, writer):
+            # echo everything back in small fragments to exercise reassembly
+            while True:
+                data = await reader.read(5)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+            writer.close()
+
+        async def main():
+            server = await asyncio.start_server(handle, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                tlv_reader, tlv_writer = await open_tlv_connection("127.0.0.1", port)
+                amount = BerTlvElement(0x9F02, bytes.fromhex("000000000100"))
+                await tlv_writer.write(amount)
+                await tlv_writer.write_many([BerTlvParser().parse_tlv_bytes(FCI), FCI])
+                tlv_writer.writer.write_eof()
+                received = [e async for e in tlv_reader]
+                await tlv_writer.close()
+            return received
+
+        received = asyncio.run(main())
+        assert [e.get_tag().hex().upper() for e in received] == ["9F02", "6F", "6F"]
+        assert received[0].get_value_as_hex_str() == "000000000100"
+        assert received[1].encode() == FCI and received[2].encode() == FCI
+
+    def test_eof_inside_element_raises(self):
+        async def main():
+            reader = asyncio.StreamReader()
+            reader.feed_data(bytes.fromhex("9F020600"))
+            reader.feed_eof()
+            return await BerTlvStreamReader(reader).read_element()
+
+        with pytest.raises(ValueError):
+            asyncio.run(main())
+
+    def test_elements_before_a_malformed_one_survive_eof(self):
+        async def main():
+            reader = asyncio.StreamReader()
+            reader.feed_data(bytes.fromhex("5A01AA" + "9F0284FFFFFFFF00"))
+            reader.feed_eof()
+            stream = BerTlvStreamReader(reader, BerTlvParser(limits=UNTRUSTED_LIMITS))
+            with pytest.raises(TlvDecodeError):
+                await stream.read_element()
+            received = await stream.read_element()
+            return received, await stream.read_element()
+
+        received, after = asyncio.run(main())
+        assert received.get_value() == b"\xAA" and after is None
+
+    def test_streaming_indefinite_encoder(self):
+        out = io.BytesIO()
+        encoder = BerTlvStreamEncoder(out)
+        with encoder.constructed(0x70):
+            for n in range(3):
+                encoder.write(BerTlvElement(0xDF01 + n, n.to_bytes(2, "big")))
+            with encoder.constructed(0xA5):
+                encoder.write(bytes.fromhex("870101"))
+        encoder.close()
+
+        raw = out.getvalue()
+        assert raw.hex().upper() == "7080" + "DF01020000" + "DF02020001" + "DF03020002" + "A580870101" + "0000" + "0000"
+        tlv = BerTlvParser().parse_tlv_bytes(raw)
+        assert tlv.find("70/A5/87").get_value() == b"\x01"
+        assert tlv.encode() == raw
+
+    def test_streaming_encoder_misuse(self):
+        encoder = BerTlvStreamEncoder(io.BytesIO())
+        with pytest.raises(ValueError):
+            encoder.begin(0x9F36)
+        with pytest.raises(ValueError):
+            encoder.write(b"\x5A\x00")
+        encoder.begin(0x70)
+        with pytest.raises(ValueError):
+            encoder.close()
@@ -0,0 +1,83 @@
+import pytest
+
+from TlvParser.TlvParser import BerTlvElement, BerTlvParser
+from TlvParser.TlvTemplate import BerTlvTemplate
+
+
+FCI = "6F398408A000000025010403A52D5010414D45524943414E20455850524553538701019F38069F35019F6E045F2D02656EBF0C079F0A0400010102"
+
+
+class TestTlvTemplate:
+
+    def test_instances_share_untouched_subtrees(self):
+        parsed = BerTlvParser().parse_tlv(FCI)
+        template = BerTlvTemplate(parsed.tlv_elements["6F"])
+        first = template.instantiate({"6F/A5/50": b"VISA"})
+        second = template.instantiate({"6F/A5/87": b"\x02", "6F/84": bytes.fromhex("A0000000031010")})
+
+        assert first.get_children()["A5"].get_children()["50"].get_value() == b"VISA"
+        reparsed = BerTlvParser().parse_tlv_bytes(first.encode())
+        assert reparsed.find("6F/A5/50").get_value() == b"VISA"
+        assert reparsed.find("6F/A5/BF0C/9F0A").get_value_as_hex_str() == "00010102"
+
+        # untouched subtrees are the template's own (frozen, cached) objects
+        assert first.get_children()["84"] is template.roots["6F"].get_children()["84"]
+        assert first.get_children()["A5"].get_children()["BF0C"] is second.get_children()["A5"].get_children()["BF0C"]
+
+        encoded = second.encode()
+        assert encoded.hex().upper().startswith("6F388407A0000000031010A5")
+        assert template.encode().hex().upper() == FCI
+        assert parsed.encode().hex().upper() == FCI   # the source tree was copied, not frozen
+
+    def test_frozen_elements_reject_edits(self):
+        template = BerTlvTemplate(BerTlvParser().parse_tlv(FCI + "9F360200AA"))
+        message = template.instantiate({"9F36": b"\x00\x42"})
+        assert message.find("9F36").get_value() == b"\x00\x42"
+        with pytest.raises(TypeError):
+            message.find("6F/A5/87").set_value_bytes(b"\x03")
+        with pytest.raises(TypeError):
+            template.roots["6F"].add_child(BerTlvElement(0x5F2D, b"de"))
+        with pytest.raises(LookupError):
+            template.instantiate({"6F/A5/9F99": b"\x00"})
+        with pytest.raises(ValueError):
+            template.instantiate({"6F/A5/BF0C": b"\x9F\x0A\x00"})   # constructed: children, not bytes
+        with pytest.raises(ValueError):
+            template.encode({"6F": b""})
+
+        # copied elements on the override path are editable, and a whole element can be swapped in
+        message = template.instantiate({"6F/A5/BF0C": BerTlvElement(0xBF0C, {})})
+        message.find("6F/A5").add_child(BerTlvElement(0x9F4D, b"\x0b\x0a"))
+        tlv = BerTlvParser().parse_tlv_bytes(message.encode())
+        assert tlv.find("6F/A5/9F4D").get_value() == b"\x0b\x0a"
+        assert tlv.find("6F/A5/BF0C") == BerTlvElement(0xBF0C)
+
+    def test_overrides_match_a_reparse(self):
+        template = BerTlvTemplate(BerTlvParser().parse_tlv(FCI).tlv_elements["6F"])
+        message = template.instantiate({"6F/A5/50": b"L" * 200})
+        reparsed = BerTlvParser().parse_tlv_bytes(message.encode()).tlv_elements["6F"]
+        assert message == reparsed and message.diff(reparsed) == []
+
+        for overrides in ({"6F/A5": BerTlvElement(0xA5, {}), "6F/A5/50": b"VISA"},
+                          {"6F/A5/50": b"VISA", "FF/6F/A5": BerTlvElement(0xA5, {})}):
+            with pytest.raises(ValueError, match="replaced by an element"):
+                template.instantiate(overrides)
+
+    def test_wide_template_splices_untouched_children(self):
+        root = BerTlvElement(0x70)
+        for k in range(126):
+            root.add_child(BerTlvElement(0xDF8100 + k, bytes([k]) * 3))
+        template = BerTlvTemplate(root)
+        overrides = {"70/DF8100": b"\x09", "70/DF8140": b"\x0A" * 300, "70/DF817D": b""}
+        message = template.instantiate(overrides)
+        message.add_child(BerTlvElement(0x9F36, b"\x00\x01"))
+        message.replace_child("DF8141", BerTlvElement(0xDF8141, b"\x0B"))
+
+        expected = BerTlvElement(0x70)
+        for k in range(126):
+            tag_name = f"DF81{k:02X}"
+            value = overrides.get("70/" + tag_name, b"\x0B" if k == 0x41 else bytes([k]) * 3)
+            expected.add_child(BerTlvElement(0xDF8100 + k, value))
+        expected.add_child(BerTlvElement(0x9F36, b"\x00\x01"))
+        assert message.encode() == expected.encode()
+        assert message.get_encoded_length() == len(expected.encode())
+        assert template.encode() == root.encode()
@@ -0,0 +1,61 @@
+from datetime import date
+
+import pytest
+
+from TlvParser import TlvValues
+from TlvParser.TlvParser import BerTlvElement, BerTlvParser, BerTlvExtractor
+from TlvParser.TlvValues import decode_batch
+from test.helpers import transaction
+
+
+class TestTlvValues:
+
+    def test_element_decoders(self):
+        tlv = BerTlvParser().parse_tlv(
+            "9F02060000000015009F36020042" "5F2A020978" "9A03261018" "5A0841111111111111115F340100" "50044D415354")
+        assert tlv.find("9F02").get_value_as_bcd() == 1500
+        assert tlv.find("9F36").get_value_as_int() == 0x42
+        assert tlv.find("5F2A").get_value_as_bcd() == 978
+        assert tlv.find("9A").get_value_as_date() == date(2026, 10, 18)
+        assert tlv.find("5A").get_value_as_cn() == "4111111111111111"
+        assert tlv.find("50").get_value_as_str() == "MAST"
+        assert BerTlvElement(0x9F36, b"\xff\xfe").get_value_as_int(signed=True) == -2
+
+    def test_decoder_errors(self):
+        with pytest.raises(ValueError):
+            BerTlvElement(0x9F02, bytes.fromhex("00000000001A")).get_value_as_bcd()
+        with pytest.raises(ValueError):
+            BerTlvElement(0x9A, bytes.fromhex("2610")).get_value_as_date()
+        with pytest.raises(ValueError):
+            decode_batch([b"\x01"], kind="float")
+        with pytest.raises(ValueError):
+            decode_batch([bytes(9)], kind="int")
+
+    @pytest.mark.parametrize("use_numpy", [False, True])
+    def test_batch_decode(self, use_numpy, monkeypatch):
+        if use_numpy:
+            pytest.importorskip("numpy")
+        else:
+            monkeypatch.setattr(TlvValues, "np", None)
+        messages = [transaction(n * 125, 978 if n % 3 else None, atc=n * 125) for n in range(50)]
+        extractor = BerTlvExtractor(["77/9F02", "77/5F2A", "77/9F36"])
+        columns = extractor.extract_decoded(messages, {"77/9F02": "bcd", "77/5F2A": "bcd", "77/9F36": "int"},
+                                            missing=-1)
+        assert list(columns["77/9F02"]) == [n * 125 for n in range(50)]
+        assert list(columns["77/5F2A"]) == [978 if n % 3 else -1 for n in range(50)]
+        assert list(columns["77/9F36"]) == [(n * 125) & 0xFFFF for n in range(50)]
+
+        # mixed widths are right aligned
+        assert list(decode_batch([b"\x01", b"\x01\x00", None, b""], kind="int")) == [1, 256, 0, 0]
+        with pytest.raises(ValueError):
+            decode_batch([b"\x12", b"\x1A"], kind="bcd")
+
+        # a negative missing value switches "int" to a signed result
+        assert list(decode_batch([b"\xff" * 7, None], kind="int", missing=-1)) == [(1 << 56) - 1, -1]
+        assert list(decode_batch([b"\xff" * 8, None], kind="int", missing=(1 << 64) - 1)) == [(1 << 64) - 1] * 2
+        with pytest.raises(ValueError):
+            decode_batch([b"\xff" * 8, None], kind="int", missing=-1)
+        with pytest.raises(ValueError):
+            decode_batch([None], kind="int", missing=1 << 64)
+        with pytest.raises(ValueError):
+            decode_batch([None], kind="bcd", missing=1 << 63)
@@ -0,0 +1,17 @@
+from TlvParser.TlvParser import BerTlvElement
+
+
+def transaction(amount=1500, currency=None, atc=None, label=None, extra=()):
+    # Encoded 77 template: 9F02 amount, then 5F2A currency, 9F36 ATC and 50 label when given,
+    # then the extra (tag, value in hex) pairs.
+    tx = BerTlvElement(0x77)
+    tx.add_child(BerTlvElement(0x9F02, bytes.fromhex(f"{amount:012d}")))
+    if currency is not None:
+        tx.add_child(BerTlvElement(0x5F2A, bytes.fromhex(f"{currency:04d}")))
+    if atc is not None:
+        tx.add_child(BerTlvElement(0x9F36, atc.to_bytes(2, "big")))
+    if label is not None:
+        tx.add_child(BerTlvElement(0x50, label))
+    for tag, value in extra:
+        tx.add_child(BerTlvElement(tag, bytes.fromhex(value)))
+    return tx.encode()